@@ -0,0 +1,105 @@
+import asyncio
+import itertools
+import time
+
+# Configuration
+API_LATENCY = 0.05  # Seconds a simulated Discord API call (send or edit) takes
+
+_ids = itertools.count(1000)
+
+
+class FakeUser:
+    def __init__(self, name: str):
+        self.id = next(_ids)
+        self.name = name
+        self.mention = f"<@{self.id}>"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeGuild:
+    def __init__(self, name: str = "benchmark"):
+        self.id = next(_ids)
+        self.name = name
+
+
+# Message as seen by the bot. Messages sent by the bot log their edits into the channel
+class FakeMessage:
+    def __init__(self, channel, author, content: str):
+        self.id = next(_ids)
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+
+    async def edit(self, content: str = None, **kwargs):
+        await asyncio.sleep(self.channel.api_latency)
+        self.content = content
+        self.channel.events.append((time.perf_counter(), "edit", self, content))
+        return self
+
+
+# Text channel that records every message the bot sends or edits with a timestamp
+class FakeChannel:
+    def __init__(self, guild: FakeGuild = None, api_latency: float = API_LATENCY, bot_user: FakeUser = None):
+        self.id = next(_ids)
+        self.guild = guild
+        self.api_latency = api_latency
+        self.bot_user = bot_user or FakeUser("bot")
+        self.events = []  # (time, "send" or "edit", message, content)
+
+    async def send(self, content: str = None, **kwargs):
+        await asyncio.sleep(self.api_latency)
+        message = FakeMessage(self, self.bot_user, content)
+        self.events.append((time.perf_counter(), "send", message, content))
+        return message
+
+    # A slash command used by a user in this channel
+    def interaction(self, user: FakeUser):
+        return FakeInteraction(self, user)
+
+
+class FakeClient:
+    async def fetch_user(self, user_id: int):
+        return FakeUser(f"User{user_id}")
+
+
+# Response of an interaction: deferring and direct answers take one API call each
+class FakeInteractionResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.deferred = False
+
+    async def defer(self, thinking: bool = False, **kwargs):
+        await asyncio.sleep(self.interaction.channel.api_latency)
+        self.deferred = True
+
+    async def send_message(self, content: str = None, **kwargs):
+        return await self.interaction.channel.send(content)
+
+
+# Follow-up messages of an interaction land in its channel like normal messages
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content: str = None, wait: bool = False, **kwargs):
+        return await self.interaction.channel.send(content)
+
+
+# Slash command used by a user in a channel, to be passed to the bot's command callbacks
+class FakeInteraction:
+    def __init__(self, channel: FakeChannel, user: FakeUser, client: FakeClient = None):
+        self.id = next(_ids)
+        self.channel = channel
+        self.channel_id = channel.id
+        self.guild = channel.guild
+        self.user = user
+        self.client = client or FakeClient()
+        self.response = FakeInteractionResponse(self)
+        self.followup = FakeFollowup(self)
+        self.expired = False  # Set to simulate a reply that waited longer than the 15 minutes of the interaction token
+
+    def is_expired(self):
+        return self.expired
@@ -0,0 +1,186 @@
+import asyncio
+import json
+import os
+import time
+
+from aiohttp import web
+
+# Configuration
+TOKENS_PER_SECOND = 50.0         # Response tokens streamed per second per request
+FIRST_TOKEN_LATENCY = 0.2        # Seconds before the first token (model overhead), on top of prompt evaluation
+PROMPT_TOKENS_PER_SECOND = 2000  # Prompt evaluation speed. Bigger prompts mean a later first token, like a real server
+RESPONSE_TOKENS = 60             # Tokens in each chat response
+PARALLEL = 1                     # Requests generated at once, like OLLAMA_NUM_PARALLEL. Others wait for a slot
+LOAD_LATENCY = 0.0               # Seconds a request waits for the model to load (first request, or a different num_ctx)
+EMBEDDING_DIM = 64
+
+
+# Whole prompt of a request in the order the model reads it (system prompt, prompt and chat messages)
+def prompt_text(data: dict):
+    text = data.get("system", "") + data.get("prompt", "")
+    return text + "".join(message.get("content", "") for message in data.get("messages", []))
+
+
+# Rough token count of a request's prompt, 4 characters per token
+def prompt_tokens(data: dict):
+    return (len(prompt_text(data)) + 3) // 4
+
+
+# What a request is for, judged by its system prompt: "extraction", "summary" or "chat"
+def request_kind(data: dict):
+    system = data.get("system", "")
+    for message in data.get("messages", []):
+        if message.get("role") == "system":
+            system = message.get("content", "")
+    if "extraction" in system:
+        return "extraction"
+    if "summarization" in system:
+        return "summary"
+    return "chat"
+
+
+# Local stand-in for an Ollama server. Streams NDJSON from /api/generate and /api/chat at a fixed token rate
+# after a delay that grows with the prompt size, and records the prompt size of every request.
+# The model is loaded by the first request (load_latency) and loaded again when a request asks for another num_ctx.
+# Like a server with one slot it only evaluates the part of a prompt that differs from the previous one.
+class FakeOllama:
+    def __init__(self, tokens_per_second: float = TOKENS_PER_SECOND, first_token_latency: float = FIRST_TOKEN_LATENCY,
+                 prompt_tokens_per_second: float = PROMPT_TOKENS_PER_SECOND, response_tokens: int = RESPONSE_TOKENS,
+                 parallel: int = PARALLEL, load_latency: float = LOAD_LATENCY, host: str = "127.0.0.1", port: int = 0):
+        self.tokens_per_second = tokens_per_second
+        self.first_token_latency = first_token_latency
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.response_tokens = response_tokens
+        self.load_latency = load_latency
+        self.host = host
+        self.port = port
+        self.requests = []  # (kind, prompt tokens) of every generation
+        self.loaded = None  # (model, num_ctx) of the loaded model
+        self.loads = 0
+        self._load_lock = asyncio.Lock()
+        self._cached_prompt = ""
+        self._slots = asyncio.Semaphore(max(1, parallel))
+        self._runner = None
+        self._counter = 0
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/api/generate", self._generate)
+        app.router.add_post("/api/chat", self._chat)
+        app.router.add_post("/api/embeddings", self._embeddings)
+        app.router.add_get("/api/ps", self._ps)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _response_tokens(self, kind: str):
+        self._counter += 1
+        if kind == "extraction":
+            # Models tend to keep talking after the JSON object, extraction can stop reading there
+            return ['{"preference": ', f'"likes benchmark topic {self._counter % 7}"', '}'] + [f" note{i}" for i in range(20)]
+        if kind == "summary":
+            return ["The ", "user ", "talked ", "about ", "benchmarks."]
+        return [f"word{i} " for i in range(self.response_tokens)]
+
+    # Seconds spent loading the model for this request, 0 if it was loaded already with the same num_ctx
+    async def _load(self, data: dict):
+        wanted = (data.get("model"), data.get("options", {}).get("num_ctx"))
+        async with self._load_lock:
+            if self.loaded == wanted:
+                return 0.0
+            await asyncio.sleep(self.load_latency)
+            self.loaded = wanted
+            self.loads += 1
+            self._cached_prompt = ""
+            return self.load_latency
+
+    # Unload the model, like Ollama does after keep_alive
+    def unload(self):
+        self.loaded = None
+        self._cached_prompt = ""
+
+    async def _stream(self, request, chat: bool):
+        data = await request.json()
+        if not data.get("prompt") and not data.get("messages"):
+            # Request without a prompt only loads the model. Like Ollama, the answer has no timings
+            await self._load(data)
+            return web.json_response({"model": data.get("model"), "done": True, "done_reason": "load"})
+        kind = request_kind(data)
+        tokens_in = prompt_tokens(data)
+        self.requests.append((kind, tokens_in))
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        async with self._slots:
+            started = time.perf_counter()
+            load = await self._load(data)
+            text = prompt_text(data)
+            cached_tokens = len(os.path.commonprefix([text, self._cached_prompt])) // 4
+            self._cached_prompt = text
+            prompt_eval = (tokens_in - cached_tokens) / self.prompt_tokens_per_second
+            await asyncio.sleep(self.first_token_latency + prompt_eval)
+            tokens = self._response_tokens(kind)
+            num_predict = data.get("options", {}).get("num_predict", -1)
+            if num_predict > 0:
+                tokens = tokens[:num_predict]
+            eval_started = time.perf_counter()
+            for token in tokens:
+                frame = {"model": data.get("model"), "done": False}
+                if chat:
+                    frame["message"] = {"role": "assistant", "content": token}
+                else:
+                    frame["response"] = token
+                try:
+                    await response.write((json.dumps(frame) + "\n").encode())
+                except ConnectionResetError:
+                    # The client stopped reading (for example extraction after its JSON object). Stop generating like Ollama does
+                    return response
+                await asyncio.sleep(1 / self.tokens_per_second)
+            done = time.perf_counter()
+            final = {
+                "model": data.get("model"),
+                "done": True,
+                "total_duration": int((done - started) * 1e9),
+                "load_duration": int(load * 1e9),
+                "prompt_eval_count": tokens_in,
+                "prompt_eval_duration": int(prompt_eval * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int((done - eval_started) * 1e9),
+            }
+            if chat:
+                final["message"] = {"role": "assistant", "content": ""}
+            else:
+                final["response"] = ""
+            await response.write((json.dumps(final) + "\n").encode())
+        await response.write_eof()
+        return response
+
+    async def _generate(self, request):
+        return await self._stream(request, chat=False)
+
+    async def _chat(self, request):
+        return await self._stream(request, chat=True)
+
+    async def _embeddings(self, request):
+        data = await request.json()
+        text = data.get("prompt", "")
+        embedding = [((hash(text) >> i) & 0xff) / 255 for i in range(EMBEDDING_DIM)]
+        return web.json_response({"embedding": embedding})
+
+    async def _ps(self, request):
+        models = []
+        if self.loaded:
+            models.append({"name": self.loaded[0], "model": self.loaded[0]})
+        return web.json_response({"models": models})
@@ -0,0 +1,181 @@
+# Offline load test of the bot: drives the real /ask command handling against a fake Ollama server and
+# fake Discord channels, and reports latency, throughput, prompt size and memory file I/O per message.
+# Usage (from the repository folder): python -m benchmarks.run_benchmark --users 10 --messages 5
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.fake_discord import FakeChannel, FakeGuild, FakeUser
+from benchmarks.fake_ollama import FakeOllama
+from discordaibot import config, engine
+from discordaibot.ollama_pool import OllamaPool
+from discordaibot.scheduler import GenerationScheduler
+
+PROMPTS = [
+    "My name is {name} and I love {topic}.",
+    "What do you know about me?",
+    "Can you explain how {topic} works in a few sentences?",
+    "I'm working on a project about {topic}, any tips?",
+    "Tell me a short story about {topic}.",
+    "What should I learn next after {topic}?",
+]
+TOPICS = ["fantasy novels", "quantum physics", "D&D", "home servers", "chess", "baking", "rust programming"]
+
+
+# Nearest-rank percentile of a list of numbers
+def percentile(values: list, p: float):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def summarize(values: list):
+    return {"p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99),
+            "mean": sum(values) / len(values) if values else 0.0}
+
+
+# Load the bot with its Ollama servers, scheduler and memory files pointed at the benchmark
+def load_bot(args, ollama_url: str, data_dir: str):
+    config.MEMORY = args.bot == "memory"
+    config.STREAM_RESPONSES = not args.no_stream
+    config.STORAGE_BACKEND = args.storage
+    config.SQLITE_DB_FILE = os.path.join(data_dir, "memory.db")
+    config.CHAT_HISTORY_FILE = os.path.join(data_dir, "chat_history.json")
+    config.LONG_TERM_MEMORY_FILE = os.path.join(data_dir, "long_term_memory.json")
+    config.EMBEDDING_CACHE_FILE = os.path.join(data_dir, "embeddings.npz")
+    config.MEMORY_DIR = os.path.join(data_dir, "memory")
+    engine.ollama = OllamaPool([ollama_url], read_timeout=config.OLLAMA_TIMEOUT, keep_alive=config.OLLAMA_KEEP_ALIVE)
+    engine.scheduler = GenerationScheduler(args.concurrency or args.parallel)
+    from discordaibot import bot
+    bot.load_memory()  # Load memory up front, so its imports don't count towards the first reply
+    return bot
+
+
+# Memory writes and bytes written so far by every loaded guild
+def memory_io(memory):
+    if memory is None:
+        return 0, 0
+    return sum(shard.store.writes for shard in memory.shards), sum(shard.store.bytes_written for shard in memory.shards)
+
+
+# One simulated user: sends messages one after another with a random pause, and times each reply
+async def run_user(bot, user: FakeUser, channel: FakeChannel, args, rng: random.Random, results: list):
+    for _ in range(args.messages):
+        await asyncio.sleep(rng.expovariate(1 / args.think_time) if args.think_time else 0)
+        prompt = rng.choice(PROMPTS).format(name=user.name, topic=rng.choice(TOPICS))
+        first_event = len(channel.events)
+        started = time.perf_counter()
+        await bot.ask_command.callback(channel.interaction(user), prompt)
+        finished = time.perf_counter()
+
+        # The reply is the "Thinking..." message. Its first edit is the first text the user sees
+        events = channel.events[first_event:]
+        thinking = next((message for _, kind, message, content in events
+                         if kind == "send" and content and content.startswith("Thinking")), None)
+        first_text = next((at for at, kind, message, _ in events if kind == "edit" and message is thinking), finished)
+        results.append({"ttft": first_text - started, "latency": finished - started})
+
+
+async def run(args):
+    fake_ollama = FakeOllama(args.token_rate, args.latency, args.prompt_rate, args.tokens, args.parallel, args.load_latency)
+    ollama_url = await fake_ollama.start()
+    data_dir = tempfile.mkdtemp(prefix="discordaibot-bench-")
+    bot = load_bot(args, ollama_url, data_dir)
+    rng = random.Random(args.seed)
+
+    # Load the model and prime the system prompts before the first user, like the bot does at startup
+    warmup = []
+    if args.warmup:
+        warmer = engine.create_warmer()
+        await warmer.warm()
+        warmup = warmer.status()
+
+    guilds = [FakeGuild(f"guild{i}") for i in range(args.guilds)]
+    users = [FakeUser(f"User{i}") for i in range(args.users)]
+    channels = [FakeChannel(guilds[i % len(guilds)], args.discord_latency) for i in range(args.users)]
+
+    results = []
+    started = time.perf_counter()
+    await asyncio.gather(*[run_user(bot, user, channel, args, random.Random(rng.random()), results)
+                           for user, channel in zip(users, channels)])
+    elapsed = time.perf_counter() - started
+
+    # Let background work finish (memory extraction, summaries) and write everything, so its I/O is counted
+    memory = bot.load_memory()
+    if memory is not None:
+        await memory.extraction.close()
+        for shard in memory.shards:
+            await shard.store.flush()
+    writes, bytes_written = memory_io(memory)
+    if memory is not None:
+        await memory.shards.close()
+    await engine.ollama.close()
+    await fake_ollama.stop()
+
+    chat_prompts = [tokens for kind, tokens in fake_ollama.requests if kind == "chat"]
+    messages = len(results)
+    report = {
+        "messages": messages,
+        "seconds": elapsed,
+        "messages_per_second": messages / elapsed if elapsed else 0.0,
+        "ttft": summarize([result["ttft"] for result in results]),
+        "latency": summarize([result["latency"] for result in results]),
+        "prompt_tokens": summarize(chat_prompts),
+        "background_requests": len(fake_ollama.requests) - len(chat_prompts),
+        "memory_writes_per_message": writes / messages if messages else 0.0,
+        "memory_bytes_per_message": bytes_written / messages if messages else 0.0,
+        "warmup": warmup,
+    }
+    return report
+
+
+def print_report(report: dict):
+    print(f"Messages: {report['messages']} in {report['seconds']:.1f}s ({report['messages_per_second']:.2f} msg/s)")
+    for key, title, unit, scale in (("ttft", "Time to first token", "ms", 1000), ("latency", "End-to-end latency", "ms", 1000),
+                                    ("prompt_tokens", "Prompt size", "tokens", 1)):
+        stats = report[key]
+        print(f"{title}: p50 {stats['p50'] * scale:.0f} {unit}, p95 {stats['p95'] * scale:.0f} {unit}, "
+              f"p99 {stats['p99'] * scale:.0f} {unit}")
+    print(f"Background generations (extraction, summaries): {report['background_requests']}")
+    print(f"Memory I/O per message: {report['memory_writes_per_message']:.2f} writes, "
+          f"{report['memory_bytes_per_message'] / 1000:.1f} kB")
+    for line in report["warmup"]:
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the Discord bot with a fake Ollama server")
+    parser.add_argument("--bot", choices=("memory", "simple"), default="memory", help="with or without memory (MEMORY)")
+    parser.add_argument("--users", type=int, default=10, help="simulated users, each in their own channel")
+    parser.add_argument("--guilds", type=int, default=1, help="servers the users are spread over")
+    parser.add_argument("--messages", type=int, default=5, help="messages per user")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean seconds a user waits between messages")
+    parser.add_argument("--tokens", type=int, default=60, help="tokens per response")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="response tokens per second")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--prompt-rate", type=float, default=2000.0, help="prompt tokens evaluated per second")
+    parser.add_argument("--parallel", type=int, default=1, help="requests the fake server generates at once")
+    parser.add_argument("--load-latency", type=float, default=0.0, help="seconds the fake server takes to load the model")
+    parser.add_argument("--warmup", action="store_true", help="warm up the model before the first message (WARMUP)")
+    parser.add_argument("--concurrency", type=int, default=0, help="MAX_CONCURRENT_GENERATIONS (default: --parallel)")
+    parser.add_argument("--discord-latency", type=float, default=0.05, help="seconds per simulated Discord API call")
+    parser.add_argument("--storage", choices=("json", "sqlite"), default="json", help="memory backend (STORAGE_BACKEND)")
+    parser.add_argument("--no-stream", action="store_true", help="turn off streamed replies")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
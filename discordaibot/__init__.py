@@ -0,0 +1 @@
+# Discord bot that answers with a local Ollama model. Settings are in config.py, start it with: python -m discordaibot
@@ -0,0 +1,5 @@
+import asyncio
+
+from .bot import main
+
+asyncio.run(main())
@@ -0,0 +1,233 @@
+import asyncio
+import time
+
+import discord
+from discord import app_commands
+
+from . import config, engine
+from .discord_dispatcher import ChannelDispatcher, InteractionChannel, split_message
+from .observability import log, metrics, sampled, setup_logging
+from .response_cache import make_cache_key
+from .rolling_history import format_turn
+from .streaming_reply import StreamingReply, ThinkFilter
+
+# Slash commands need no message intents: Discord only sends the bot the interactions of its own commands
+intents = discord.Intents.none()
+intents.guilds = True
+client = discord.Client(intents=intents)
+tree = app_commands.CommandTree(client)
+
+_memory = None
+warmer = None
+
+# Memory of the bot (discordaibot.memory_feature), or None when config.MEMORY is off.
+# Imported on first use, so the bot connects to Discord without loading numpy, SQLite and the memory indexes first
+def load_memory():
+    global _memory
+    if _memory is None and config.MEMORY:
+        from . import memory_feature
+        _memory = memory_feature
+    return _memory
+
+# Answer the prompt of /ask. The interaction has to be deferred already
+async def answer(interaction: discord.Interaction, prompt: str):
+    received = time.perf_counter()
+    user_id = str(interaction.user.id)  # Ensure user_id is a string
+    outbound = ChannelDispatcher(InteractionChannel(interaction))
+
+    # Only the memory of the server the command was used in is used (direct messages have their own)
+    memory_feature = load_memory()
+    memory = memory_feature.acquire(interaction.guild) if memory_feature is not None else None
+    try:
+        full_context, history_turns, mentioned_users = "", None, []
+        if memory is not None:
+            # Check if the user is new (not in chat history)
+            if not memory.store.has_history(user_id):
+                await outbound.send(config.DISCLAIMER_MESSAGE)
+            full_context, history_turns, mentioned_users = await memory_feature.build_context(
+                memory, interaction.user, prompt, interaction.client.fetch_user)
+
+        # Streamed pieces of the response go through the <think> filter into the reply
+        on_text = None
+        if config.STREAM_RESPONSES:
+            reply = StreamingReply(outbound, config.STREAM_EDIT_INTERVAL)
+            think_filter = ThinkFilter(config.SHOW_THINK_SECTION)
+            on_text = lambda chunk: reply.append(think_filter.feed(chunk))
+
+        # Look for a cached response to the same prompt with the same context
+        cache_key = None
+        cached_response = None
+        if engine.response_cache is not None:
+            cache_key = make_cache_key(config.MODEL_NAME, config.CHAT_SYSTEM_PROMPT, prompt,
+                                       full_context + "\n".join(format_turn(turn) for turn in history_turns or []))
+            cached_response = engine.response_cache.get(cache_key)
+
+        if cached_response is not None:
+            pending_response = asyncio.get_running_loop().create_future()
+            pending_response.set_result(cached_response)
+            queue_position = 0
+        else:
+            # Queue the request for the Ollama API, including the context
+            pending_response, queue_position = engine.scheduler.submit(
+                user_id, lambda: engine.ask_ollama(prompt, config.CHAT_SYSTEM_PROMPT, full_context, on_text, history_turns, user_id)
+            )
+
+        # Replace Discord's "thinking..." with our own, with the queue position if we have to wait
+        if queue_position:
+            thinking_message = await outbound.send(f"Thinking... (#{queue_position} in queue)")
+        else:
+            thinking_message = await outbound.send("Thinking...")
+        if config.STREAM_RESPONSES:
+            reply.attach(thinking_message)
+
+        log.debug("User message from %s: %s", interaction.user, prompt)
+
+        # Wait for the response
+        response = await pending_response
+
+        log.debug("Ollama response: %s", response)
+
+        # Cache the new response (never errors), tied to every user whose memory is in the context
+        if cache_key and cached_response is None and not response.startswith("Error:"):
+            engine.response_cache.put(cache_key, response, [user_id, *mentioned_users])
+
+        # Update the current user's chat history with the new interaction.
+        # Messages that no longer fit into HISTORY_TOKEN_BUDGET are folded into the summary in the background
+        if memory is not None:
+            memory.history.append(user_id, [
+                {"role": "User", "content": prompt},
+                {"role": "Assistant", "content": response},
+            ])
+
+        # Process the <think></think> section
+        formatted_response = engine.process_think_section(response)
+
+        if config.STREAM_RESPONSES:
+            # Show the rest of the streamed response, or the error if nothing was streamed or the stream broke off
+            reply.append(think_filter.finish())
+            await reply.finish(fallback=formatted_response, error=response if response.startswith("Error:") else None)
+        else:
+            # Split the response into messages of up to 2000 characters at sentence or code block boundaries.
+            # The first part replaces the "thinking..." message, the rest is sent after it
+            chunks = split_message(formatted_response) or [formatted_response]
+            try:
+                await asyncio.gather(outbound.edit(thinking_message, chunks[0]), *[outbound.send(chunk) for chunk in chunks[1:]])
+            except discord.HTTPException as e:
+                log.warning("Failed to edit message: %s", e)
+                await outbound.send("Failed to update the response message.")
+
+        # Time from receiving the command until the whole reply is shown
+        elapsed = time.perf_counter() - received
+        metrics.observe("response", elapsed)
+        metrics.increment("messages")
+        if sampled(config.LOG_SAMPLE_RATE):
+            log.info("Answered %s in %.2fs (%d characters, cached: %s)", interaction.user, elapsed, len(response),
+                     cached_response is not None)
+
+        # Extract important information from the user's input only.
+        # Runs in the background after the reply is sent, so the user doesn't wait for it
+        if memory is not None:
+            memory_feature.extraction.submit(user_id, prompt, mentioned_users, memory.guild_id)
+    finally:
+        if memory is not None:
+            memory_feature.shards.release(memory)
+
+@tree.command(name="ask", description="Chat with the bot")
+@app_commands.describe(prompt="Your message")
+async def ask_command(interaction: discord.Interaction, prompt: str):
+    # Discord wants an answer within 3 seconds. Deferring shows "thinking..." until the first reply is sent
+    await interaction.response.defer(thinking=True)
+    await answer(interaction, prompt)
+
+# Only registered when memory is on
+@app_commands.command(name="clearhistory", description="Forget your chat history and long-term memory")
+async def clear_history_command(interaction: discord.Interaction):
+    memory_feature = load_memory()
+    memory = memory_feature.acquire(interaction.guild)
+    try:
+        memory_feature.clear_user(memory, str(interaction.user.id))
+    finally:
+        memory_feature.shards.release(memory)
+    await interaction.response.send_message("Your chat history and long-term memory have been cleared. 🧹", ephemeral=True)
+
+@tree.command(name="queue", description="Show the prompt queue")
+async def queue_command(interaction: discord.Interaction):
+    scheduler = engine.scheduler
+    lines = [
+        f"Generating: {scheduler.running}/{scheduler.max_concurrent}",
+        f"Waiting: {scheduler.queue_depth()} (yours: {scheduler.queue_depth(str(interaction.user.id))})",
+        f"Average wait: {scheduler.average_wait():.1f}s, longest current wait: {scheduler.oldest_wait():.1f}s",
+    ]
+    memory_feature = load_memory()
+    if memory_feature is not None:
+        memory = memory_feature.acquire(interaction.guild)
+        try:
+            lines += memory_feature.status_lines(memory)
+        finally:
+            memory_feature.shards.release(memory)
+    response_cache = engine.response_cache
+    if response_cache is not None:
+        lines.append(f"Response cache: {response_cache.hits} hits, {response_cache.misses} misses, "
+                     f"{len(response_cache)} entries ({response_cache.size / 1000:.0f} kB)")
+    if len(engine.ollama) > 1:
+        lines += ["Ollama servers:", *engine.ollama.status()]
+    await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+@tree.command(name="stats", description="Show response times and token counts")
+async def stats_command(interaction: discord.Interaction):
+    uptime = time.time() - metrics.started
+    counters = metrics.counters
+    await interaction.response.send_message("\n".join([
+        f"Uptime: {uptime / 3600:.1f} h, messages answered: {counters.get('messages', 0)}",
+        f"Tokens: {counters.get('ollama_prompt_tokens', 0)} prompt, {counters.get('ollama_response_tokens', 0)} response, "
+        f"{counters.get('context_tokens_saved', 0)} saved by context trimming",
+        f"Memory writes: {counters.get('memory_writes', 0)} ({counters.get('memory_bytes_written', 0) / 1000:.0f} kB)",
+        f"Model cold starts after warm-up: {counters.get('model_cold_starts', 0)}",
+        *(warmer.status() if warmer is not None else []),
+        *metrics.summary_lines(["response", "time_to_first_token", "queue_wait", "context_build", "context_tokens",
+                                "generation", "ollama_tokens_per_second", "extraction", "persistence", "discord_send", "discord_edit",
+                                "ollama_load_duration"]),
+    ]), ephemeral=True)
+
+@tree.command(name="help", description="Show the bot's commands")
+async def help_command(interaction: discord.Interaction):
+    commands = ["**/ask** for chatting with bot"]
+    if config.MEMORY:
+        commands.append("**/clearhistory** for clearing users history")
+    commands += ["**/queue** for showing the prompt queue", "**/stats** for showing response times and token counts"]
+    await interaction.response.send_message("\n".join(commands), ephemeral=True)
+
+# Register the slash commands with Discord. On COMMAND_GUILD_ID they show up right away, globally it can take a while
+async def sync_commands():
+    if config.MEMORY:
+        tree.add_command(clear_history_command)
+    guild = discord.Object(config.COMMAND_GUILD_ID) if config.COMMAND_GUILD_ID else None
+    if guild is not None:
+        tree.copy_global_to(guild=guild)
+    synced = await tree.sync(guild=guild)
+    log.info("Registered %d slash commands", len(synced))
+
+# Run the bot
+async def main():
+    global warmer
+    setup_logging(config.LOG_LEVEL)
+    metrics_server = None
+    if config.METRICS_PORT:
+        metrics_server = await metrics.start_http_server(config.METRICS_PORT)
+    # Warm up while connecting to Discord, then keep the model loaded
+    if config.WARMUP:
+        warmer = engine.create_warmer()
+        warmer.start()
+    try:
+        async with client:
+            await client.login(config.DISCORD_TOKEN)
+            await sync_commands()
+            await client.connect()
+    finally:
+        if warmer is not None:
+            await warmer.close()
+        if _memory is not None:
+            await _memory.close()
+        await engine.close()
+        if metrics_server is not None:
+            await metrics_server.cleanup()
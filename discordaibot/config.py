@@ -0,0 +1,126 @@
+# Settings of the bot. Edit them here, then start the bot with: python -m discordaibot
+# Configuration
+DISCORD_TOKEN = "Discord token"  # Replace with your bot token
+MEMORY = True              # Remember users (chat history, long-term memory, extraction). False = simple bot that only answers prompts
+COMMAND_GUILD_ID = None    # Server ID to register the slash commands on (shows up instantly, good for testing). None = every server (can take up to an hour)
+MODEL_NAME = "AI model"    # Model to use for Ollama API
+OLLAMA_URLS = ["http://localhost:11434"]  # Ollama servers. With several, requests go to the least busy one and each user sticks to one server
+OLLAMA_TIMEOUT = 300       # Seconds to wait for the next piece of a response before giving up
+OLLAMA_API = "chat"        # "chat" sends history as chat messages (/api/chat) so Ollama can reuse its prompt cache. "generate" sends one prompt (/api/generate)
+OLLAMA_KEEP_ALIVE = "30m"  # How long Ollama keeps the model loaded between messages
+WARMUP = True              # Load the model and prime the system prompts at startup, so the first message doesn't wait for them
+WARMUP_PING_INTERVAL = 600  # Seconds between pings that keep the model loaded. Keep it below OLLAMA_KEEP_ALIVE
+NUM_PREDICT = 1024         # Max tokens of a response. -1 = no limit
+NUM_CTX = 4096             # Context window of the model in tokens. Must fit the system prompt, CONTEXT_TOKEN_BUDGET and the response
+MAX_CONCURRENT_GENERATIONS = 1  # Prompts generated at the same time. Match OLLAMA_NUM_PARALLEL of your Ollama server (summed over all servers)
+STREAM_RESPONSES = True     # Show the response while it is being generated by editing the "Thinking..." message
+STREAM_EDIT_INTERVAL = 1.0  # Min seconds between two edits of a streamed response (Discord rate limits edits)
+SHOW_THINK_SECTION = False  # Set to False to hide the <think></think> section. Only function on Deepseek model. When False Think will not be displayed. Othervise Think will be in spoiler
+CHAT_HISTORY_FILE = "chat_history.json"    # File to store short-term chat history. Default is same as bot location
+LONG_TERM_MEMORY_FILE = "long_term_memory.json"  # File to store long-term memory. Default is same as bot location
+GUILD_MEMORY = True         # Keep memory separate per server. False = all servers share one memory (the old behaviour)
+MEMORY_DIR = "memory"      # Folder with the JSON memory of each server (memory/<server id>/). Direct messages use the files below
+SHARD_IDLE_TIMEOUT = 900   # Seconds a server's memory stays loaded after its last message
+STORAGE_BACKEND = "json"   # "json" for the two files above, "sqlite" for SQLITE_DB_FILE. Use migrate_to_sqlite.py to move existing JSON memory
+SQLITE_DB_FILE = "memory.db"  # SQLite database used when STORAGE_BACKEND is "sqlite"
+HISTORY_TOKEN_BUDGET = 600                 # Tokens of recent chat history kept word for word per user. Older messages are summarized
+HISTORY_SUMMARY_TOKENS = 150               # Max tokens of the running summary of older messages
+CONTEXT_TOKEN_BUDGET = 1500                # Max tokens of memory and chat history added to each prompt
+SEMANTIC_MEMORY = True                     # Put the long-term memory facts most relevant to the prompt first, so the least relevant are trimmed when over budget. Needs numpy
+EMBEDDING_MODEL = None                     # Ollama embedding model for semantic memory (for example "nomic-embed-text"). None = simple built-in word matching
+EMBEDDING_CACHE_FILE = "embeddings.npz"    # File to cache fact embeddings, so they are not computed again on every start
+EMBEDDING_QUERY_TIMEOUT = 2.0              # Seconds to wait for the embedding of a prompt before answering without semantic ranking
+RESPONSE_CACHE = False                     # Reuse responses to repeated prompts with the same context instead of generating them again
+RESPONSE_CACHE_TTL = 3600                  # Seconds a cached response is reused
+RESPONSE_CACHE_MAX_BYTES = 5_000_000       # Max size of all cached responses
+RESPONSE_CACHE_FILE = None                 # File to keep cached responses across restarts (for example "response_cache.json"). None = memory only
+EXTRACTION_BATCH_SIZE = 5                  # Max messages combined into one extraction prompt when extraction falls behind
+EXTRACTION_JSON_FORMAT = True              # Ask Ollama for JSON only (format "json") and stop extraction after the first complete object
+MEMORY_MAX_FACTS_PER_USER = 30             # Long-term memory facts kept per user. Older, less important facts are folded into a summary
+MEMORY_COMPACTION_INTERVAL = 3600          # Seconds between long-term memory compaction runs (a server is also compacted when it is unloaded)
+LOG_LEVEL = "INFO"                         # "DEBUG" also logs full prompts, responses and extracted facts
+LOG_SAMPLE_RATE = 0.1                      # Share of messages logged at INFO level. Errors are always logged
+METRICS_PORT = None                        # Port for Prometheus metrics on /metrics (for example 9100). None = only the /stats command
+DISCLAIMER_MESSAGE = "⚠️ **Disclaimer:** This bot stores chat history to provide context-aware responses. By using this bot, you agree to your messages being stored."
+
+# System prompts - Behaviour of AI chat bot
+CHAT_SYSTEM_PROMPT = """
+You are a friendly and empathetic chatbot named NightshowStarAI. Your goal is to provide helpful, engaging, and human-like responses. Use emojis to make your responses more expressive. Keep your answers concise but informative.
+
+Rules:
+1. Always address the user by their name if you know it.
+2. Use the information you have about the user to provide personalized responses, but NEVER mention "memory," "data," or "long-term memory."
+3. If the user asks about themselves, share what you know about them in a natural way, as if you're recalling it from a conversation.
+4. If you don't know something about the user, ask them to share more information in a friendly way.
+
+Example 1:
+User: "What do you know about me?"
+Response: "😊 Well, Swit, I know you're a warm-hearted person who loves playing D&D. You're also a Ranger in Nova Terra, which means you're resourceful and determined. Is there anything else you'd like to share?"
+
+Example 2:
+User: "Tell me about Lojza."
+Response: "🤖 Lojza is a software engineering student at SPST. They're fascinated by quantum physics and own 8 computers. They're also a big fan of The Big Bang Theory! 😊"
+
+Example 3:
+User: "I don't think you know me."
+Response: "😊 You're right, I don't know much about you yet. But I'd love to learn! What's your name, and what are your interests?"
+"""
+
+#EXTRACTION_SYSTEM_PROMPT - Don't edit unless AI is not returning valid JSON.
+EXTRACTION_SYSTEM_PROMPT = """
+You are an information extraction assistant. Your task is to extract important information about users from the conversation, such as their names, preferences, or key facts. Focus only on information that is specific to the user and avoid general knowledge.
+
+Rules:
+1. Always extract the user's name if mentioned.
+2. Extract specific preferences, interests, or facts about the user.
+3. If the user mentions another person, extract their name and any relevant information about them.
+4. If no name is mentioned, associate the extracted information with the current user.
+5. Return the information in JSON format with keys like "name", "preference", or "fact".
+
+Example 1:
+User: "My name is Alex, and I love reading fantasy novels."
+Output:
+{
+    "name": "Alex",
+    "preference": "loves reading fantasy novels"
+}
+
+Example 2:
+User: "I'm working on a project called USB Raid Array."
+Output:
+{
+    "project": "USB Raid Array"
+}
+
+Example 3:
+User: "My friend Lojza is a software engineering student."
+Output:
+{
+    "name": "Lojza",
+    "fact": "software engineering student"
+}
+
+If no user-specific information is found, return an empty JSON object: {}
+"""
+
+# Added to the extraction prompt when several messages are extracted at once
+EXTRACTION_BATCH_INSTRUCTIONS = """
+Extract the information from each numbered message separately.
+Return ONE JSON object whose keys are the message numbers and whose values are the JSON objects for those messages, for example:
+{"1": {"name": "Alex", "preference": "loves reading fantasy novels"}, "2": {}}
+"""
+
+#HISTORY_SUMMARY_SYSTEM_PROMPT - Used to fold older chat messages into a running summary of the conversation
+HISTORY_SUMMARY_SYSTEM_PROMPT = """
+You are a conversation summarization assistant. You get the summary of a conversation so far and the messages that followed it.
+Write an updated summary (at most 4 sentences) that keeps the topics, questions, answers and anything the user asked to remember.
+Don't add anything that isn't in the conversation. Return only the summary text.
+"""
+
+#SUMMARY_SYSTEM_PROMPT - Used to fold old facts about a user into a short summary when their memory grows too large
+SUMMARY_SYSTEM_PROMPT = """
+You are a memory summarization assistant. You get facts about a user and possibly an earlier summary about them.
+Write one short summary (at most 3 sentences) that keeps every specific detail: names, preferences, projects and facts.
+Don't add anything that isn't in the facts. Return only the summary text.
+"""
+
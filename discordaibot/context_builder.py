@@ -0,0 +1,90 @@
+# Configuration
+CHARS_PER_TOKEN = 4  # Rough characters per token, good enough for budgeting without a tokenizer
+
+
+# Cheap token estimate (about 4 characters per token for English text)
+def estimate_tokens(text: str):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class _Section:
+    def __init__(self, key, title, lines, priority, keep_newest):
+        self.key = key
+        self.title = title
+        self.lines = lines
+        self.priority = priority
+        self.keep_newest = keep_newest
+        self.kept = []
+
+
+# Builds the context for one prompt from only the sections that matter for it
+# (author, mentioned users, bot memory, chat history).
+# Sections are deduplicated by key, lines repeated within a section are dropped, and the result is cut to a token budget.
+# A line shared by two sections stays in both: each one says something about a different user.
+# Lower priority sections are the first to lose lines when the budget runs out.
+class ContextBuilder:
+    def __init__(self, token_budget: int):
+        self.token_budget = token_budget
+        self.sections = []
+        self.candidate_tokens = 0
+        self.duplicate_tokens = 0
+        self.trimmed_tokens = 0
+        self._keys = set()
+
+    # Add a section. key identifies what it is about (for example a user ID) so the same user is only added once.
+    # keep_newest keeps the last lines instead of the first ones when trimming (used for chat history).
+    # dedupe=False keeps repeated lines (chat history may repeat a message on purpose).
+    def add_section(self, key, title: str, lines: list, priority: int = 0, keep_newest: bool = False, dedupe: bool = True):
+        section_tokens = sum(estimate_tokens(line) + 1 for line in lines)
+        self.candidate_tokens += section_tokens
+        if key in self._keys or not lines:
+            self.duplicate_tokens += section_tokens
+            return
+        self._keys.add(key)
+
+        unique_lines = lines
+        if dedupe:
+            unique_lines = list(dict.fromkeys(lines))
+            self.duplicate_tokens += section_tokens - sum(estimate_tokens(line) + 1 for line in unique_lines)
+        self.sections.append(_Section(key, title, unique_lines, priority, keep_newest))
+
+    # exclude: keys of sections that still count against the budget but are left out of the text
+    # (chat mode sends the history as separate messages, see kept_lines)
+    def build(self, exclude=()):
+        remaining = self.token_budget
+        for section in sorted(self.sections, key=lambda section: -section.priority):
+            lines = reversed(section.lines) if section.keep_newest else section.lines
+            kept = []
+            kept_tokens = 0
+            title_tokens = estimate_tokens(section.title) + 1 if section.title else 0
+            for line in lines:
+                line_tokens = estimate_tokens(line) + 1
+                cost = line_tokens + (0 if kept else title_tokens)
+                if cost > remaining:
+                    break
+                remaining -= cost
+                kept_tokens += line_tokens
+                kept.append(line)
+            self.trimmed_tokens += sum(estimate_tokens(line) + 1 for line in section.lines) - kept_tokens
+            section.kept = list(reversed(kept)) if section.keep_newest else kept
+
+        parts = []
+        for section in self.sections:
+            if not section.kept or section.key in exclude:
+                continue
+            if section.title:
+                parts.append(section.title + "\n" + "\n".join(section.kept))
+            else:
+                parts.append("\n".join(section.kept))
+        return "\n\n".join(parts)
+
+    # Lines of a section that fit into the budget. Only valid after build()
+    def kept_lines(self, key):
+        for section in self.sections:
+            if section.key == key:
+                return section.kept
+        return []
+
+    @property
+    def saved_tokens(self):
+        return self.duplicate_tokens + self.trimmed_tokens
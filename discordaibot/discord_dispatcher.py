@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+
+import discord
+
+from .observability import metrics
+
+# Configuration
+MESSAGE_LIMIT = 2000      # Discord message length limit
+REPLY_RATE_LIMIT = 5      # Messages sent or edited per reply...
+REPLY_RATE_PERIOD = 5.0   # ...per this many seconds (a reply's follow-ups share the bucket of its interaction token)
+
+log = logging.getLogger(__name__)
+
+_FENCE = re.compile(r"^```[^\n]*$", re.MULTILINE)
+
+
+# (start, end) of every fenced code block. An unclosed block runs to the end of the text
+def _code_ranges(text: str):
+    ranges = []
+    start = None
+    for match in _FENCE.finditer(text):
+        if start is None:
+            start = match.start()
+        else:
+            ranges.append((start, match.end()))
+            start = None
+    if start is not None:
+        ranges.append((start, len(text)))
+    return ranges
+
+
+def _inside_code(position: int, ranges):
+    return any(start < position < end for start, end in ranges)
+
+
+# Best place to cut text so the first part fits into limit characters.
+# Prefers, in this order: around a code block, a paragraph break, a line break, the end of a sentence, a space.
+# Cuts inside code blocks are only used at line breaks and only when nothing else fits.
+def split_point(text: str, limit: int = MESSAGE_LIMIT):
+    if len(text) <= limit:
+        return len(text)
+    lowest = limit // 2  # Don't make tiny messages just to hit a nice boundary
+    ranges = _code_ranges(text)
+
+    def best(positions):
+        positions = [p for p in positions if lowest <= p <= limit]
+        return max(positions, default=None)
+
+    outside = lambda positions: [p for p in positions if not _inside_code(p, ranges)]
+    candidates = [
+        [edge for block in ranges for edge in block],
+        outside([m.start() for m in re.finditer(r"\n\n", text[:limit + 1])]),
+        outside([m.start() for m in re.finditer(r"\n", text[:limit + 1])]),
+        outside([m.end() for m in re.finditer(r"[.!?](?=\s)", text[:limit])]),
+        outside([m.start() for m in re.finditer(r" ", text[:limit + 1])]),
+        [m.start() for m in re.finditer(r"\n", text[:limit + 1])],
+    ]
+    for positions in candidates:
+        cut = best(positions)
+        if cut:
+            return cut
+    return limit
+
+
+# Opening fence line of the code block that is still open at the end of text, or None
+def _open_fence(text: str):
+    fences = _FENCE.findall(text)
+    return fences[-1] if len(fences) % 2 else None
+
+
+# Split text into Discord sized messages at natural boundaries.
+# A code block that has to be split is closed at the end of one message and reopened in the next.
+def split_message(text: str, limit: int = MESSAGE_LIMIT):
+    chunks = []
+    text = text.strip()
+    while text:
+        if len(text) <= limit:
+            chunks.append(text)
+            break
+        cut = split_point(text, limit - 4)  # Leave room to close a code block
+        chunk, text = text[:cut].rstrip(), text[cut:]
+        fence = _open_fence(chunk)
+        if fence:
+            chunk += "\n```"
+            text = fence + "\n" + text.lstrip("\n")
+        else:
+            text = text.lstrip()
+        chunks.append(chunk)
+    return chunks
+
+
+# Local model of a Discord rate-limit bucket: limit requests per period, refilled continuously
+class RateLimitBucket:
+    def __init__(self, limit: int = REPLY_RATE_LIMIT, period: float = REPLY_RATE_PERIOD):
+        self.limit = limit
+        self.period = period
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.limit, self.tokens + (now - self.updated) * self.limit / self.period)
+        self.updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) * self.period / self.limit)
+
+
+class _Operation:
+    __slots__ = ("message", "content", "future")
+
+    def __init__(self, message, content, future):
+        self.message = message  # None for a new message
+        self.content = content
+        self.future = future
+
+
+# Outbound queue of one reply. channel has send(content) and edit(message, content), see InteractionChannel.
+# Sends and edits go out in order, paced by the reply's rate-limit bucket instead of fixed sleeps.
+# Follow-ups of an interaction go through its own webhook token, not the channel's message bucket,
+# so every reply has its own bucket. An edit of a message that already has an edit waiting replaces that edit,
+# so quick successive edits become one request.
+class ChannelDispatcher:
+    def __init__(self, channel, bucket: RateLimitBucket = None):
+        self.channel = channel
+        self.bucket = bucket or RateLimitBucket()
+        self._queue = deque()
+        self._pending_edits = {}  # id(message) -> waiting edit operation
+        self._task = None
+
+    # Queue a new message. The returned future resolves to the sent discord.Message
+    def send(self, content: str):
+        return self._enqueue(_Operation(None, content, asyncio.get_running_loop().create_future()))
+
+    # Queue an edit. The returned future resolves when the message shows content (or a newer edit)
+    def edit(self, message, content: str):
+        waiting = self._pending_edits.get(id(message))
+        if waiting is not None:
+            waiting.content = content
+            metrics.increment("discord_edits_merged")
+            return waiting.future
+        operation = _Operation(message, content, asyncio.get_running_loop().create_future())
+        self._pending_edits[id(message)] = operation
+        return self._enqueue(operation)
+
+    def _enqueue(self, operation: _Operation):
+        self._queue.append(operation)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return operation.future
+
+    async def _run(self):
+        while self._queue:
+            operation = self._queue[0]
+            await self.bucket.acquire()
+            self._queue.popleft()
+            if operation.message is not None:
+                # From here on, new edits of this message need a new request
+                self._pending_edits.pop(id(operation.message), None)
+            try:
+                if operation.message is None:
+                    with metrics.span("discord_send"):
+                        result = await self.channel.send(operation.content)
+                else:
+                    with metrics.span("discord_edit"):
+                        result = await self.channel.edit(operation.message, operation.content)
+            except discord.HTTPException as e:
+                metrics.increment("discord_errors")
+                if not operation.future.done():
+                    operation.future.set_exception(e)
+            else:
+                if not operation.future.done():
+                    operation.future.set_result(result)
+
+
+# Replies to a slash command, for a ChannelDispatcher. The first message fills the deferred "thinking..."
+# response and later ones are follow-ups, which can be edited like normal messages.
+# The interaction token expires after 15 minutes (a prompt can wait that long in the queue). After that,
+# messages are sent to the channel instead, and an edit of a follow-up sends its new content as a channel message.
+class InteractionChannel:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self._followups = set()  # id() of messages sent through the interaction token
+        self._moved = {}         # id() of a follow-up -> channel message that replaced it after the token expired
+        self._warned = False
+
+    def _expired(self):
+        expired = self.interaction.is_expired()
+        if expired and not self._warned:
+            self._warned = True
+            log.warning("Interaction of %s expired, replying in the channel instead", self.interaction.user)
+        return expired
+
+    async def send(self, content: str):
+        if not self._expired():
+            message = await self.interaction.followup.send(content, wait=True)
+            self._followups.add(id(message))
+            return message
+        return await self.interaction.channel.send(content)
+
+    async def edit(self, message, content: str):
+        moved = self._moved.get(id(message))
+        if moved is not None:
+            return await moved.edit(content=content)
+        if id(message) in self._followups and self._expired():
+            self._moved[id(message)] = await self.interaction.channel.send(content)
+            return self._moved[id(message)]
+        return await message.edit(content=content)
@@ -0,0 +1,140 @@
+import asyncio
+import re
+import time
+
+import aiohttp
+
+from . import config
+from .observability import log, metrics
+from .ollama_client import frame_text, generation_options
+from .ollama_pool import OllamaPool
+from .response_cache import ResponseCache
+from .scheduler import GenerationScheduler
+from .warmup import ModelWarmer
+
+# Shared Ollama servers (one keep-alive connection pool per server for all requests)
+ollama = OllamaPool(config.OLLAMA_URLS, read_timeout=config.OLLAMA_TIMEOUT, keep_alive=config.OLLAMA_KEEP_ALIVE)
+
+# Queues prompts per user and hands out generation slots round-robin
+scheduler = GenerationScheduler(config.MAX_CONCURRENT_GENERATIONS)
+
+# Cache of generated responses. Entries of a user are dropped when their memory changes or is cleared
+response_cache = None
+if config.RESPONSE_CACHE:
+    response_cache = ResponseCache(config.RESPONSE_CACHE_MAX_BYTES, config.RESPONSE_CACHE_TTL, config.RESPONSE_CACHE_FILE)
+
+
+# Function to ask Ollama
+# chat_history is the context built from memory (long-term memory of the relevant users and chat history).
+# history_turns are the recent messages sent as separate chat messages when OLLAMA_API is "chat".
+# on_text is called with every streamed piece of the response. user_id keeps the user's requests on one server
+async def ask_ollama(prompt: str, system_prompt: str = "", chat_history=None, on_text=None, history_turns=None, user_id=None):
+    full_prompt = ""
+    
+    # Add chat history (if provided)
+    if chat_history:
+        if isinstance(chat_history, str):
+            # If chat_history is a string, use it directly
+            full_prompt += f"Chat History:\n{chat_history}\n\n"
+        elif isinstance(chat_history, list):
+            # If chat_history is a list, format it
+            context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in chat_history])
+            full_prompt += f"Chat History:\n{context}\n\n"
+    
+    # Add the current user prompt
+    full_prompt += f"User: {prompt}"
+    
+    if config.OLLAMA_API == "chat":
+        # Messages go from most to least stable: system prompt, earlier turns, then this turn with its memory context.
+        # Consecutive requests of a user share everything up to the new turn, so Ollama reuses its cached prompt
+        messages = [{"role": "system", "content": system_prompt}]
+        for turn in history_turns or []:
+            messages.append({"role": turn["role"].lower(), "content": turn["content"]})
+        messages.append({"role": "user", "content": full_prompt})
+        data = {
+            "messages": messages,
+            "model": config.MODEL_NAME,  # Use the configured model
+            "options": generation_options(0.7, config.NUM_PREDICT, config.NUM_CTX),
+        }
+        stream = ollama.stream_chat(data, user_id)
+    else:
+        # Prepare the data for the Ollama API request
+        data = {
+            "prompt": full_prompt,
+            "model": config.MODEL_NAME,  # Use the configured model
+            "options": generation_options(0.7, config.NUM_PREDICT, config.NUM_CTX),
+            "system": system_prompt
+        }
+        stream = ollama.stream_generate(data, user_id)
+    
+    try:
+        response_data = ""
+        started = time.perf_counter()
+        with metrics.span("generation"):
+            async for line_json in stream:
+                text = frame_text(line_json)
+                if text:
+                    if not response_data:
+                        metrics.observe("time_to_first_token", time.perf_counter() - started)
+                    response_data += text
+                    if on_text:
+                        on_text(text)
+        return response_data.strip() if response_data else "Error: No response from model."
+    except asyncio.TimeoutError:
+        log.warning("Ollama request timed out")
+        return "Error: Request timed out."
+    except aiohttp.ClientError as e:
+        log.warning("Ollama request failed: %s", e)
+        return f"Error: {str(e)}"
+
+# Requests that prime Ollama's prompt cache with the system prompts. They use the same options as the real requests
+# (a different num_ctx would make Ollama reload the model) and generate one token.
+# Chat goes last, a server with one slot only keeps the prompt cache of its last request
+def warmup_requests():
+    requests = []
+    if config.MEMORY:
+        requests.append(("extraction", "stream_generate", {
+            "prompt": "User: Hi",
+            "model": config.MODEL_NAME,
+            "options": generation_options(0.5, 1, config.NUM_CTX),
+            "system": config.EXTRACTION_SYSTEM_PROMPT,
+            **({"format": "json"} if config.EXTRACTION_JSON_FORMAT else {}),
+        }))
+    if config.OLLAMA_API == "chat":
+        requests.append(("chat", "stream_chat", {
+            "messages": [{"role": "system", "content": config.CHAT_SYSTEM_PROMPT}, {"role": "user", "content": "User: Hi"}],
+            "model": config.MODEL_NAME,
+            "options": generation_options(0.7, 1, config.NUM_CTX),
+        }))
+    else:
+        requests.append(("chat", "stream_generate", {
+            "prompt": "User: Hi",
+            "model": config.MODEL_NAME,
+            "options": generation_options(0.7, 1, config.NUM_CTX),
+            "system": config.CHAT_SYSTEM_PROMPT,
+        }))
+    return requests
+
+# Keeps the model loaded and the system prompts cached on every Ollama server. Started by the bot when WARMUP is on
+def create_warmer():
+    return ModelWarmer(ollama, config.MODEL_NAME, warmup_requests(), generation_options(num_ctx=config.NUM_CTX),
+                       config.WARMUP_PING_INTERVAL)
+
+# Function to process the <think></think> section
+def process_think_section(response: str):
+    if config.SHOW_THINK_SECTION:
+        # Replace <think> and </think> with spoiler tags (||)
+        response = response.replace("<think>", "||").replace("</think>", "||")
+    else:
+        # Remove everything between <think> and </think> including the tags
+        response = re.sub(r'<think>(.*?)</think>', '', response, flags=re.DOTALL)
+    
+    # Remove leading and trailing whitespace
+    response = response.strip()
+    return response
+
+# Write what is still waiting and close the connections to Ollama
+async def close():
+    await ollama.close()
+    if response_cache is not None:
+        response_cache.save()  # Write any changes that are still waiting
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+
+from .observability import metrics
+
+# Configuration
+EXTRACTION_QUEUE_SIZE = 100  # Messages waiting for extraction. When full, new messages are skipped
+EXTRACTION_RETRIES = 3       # Attempts per batch before it is dropped
+EXTRACTION_RETRY_DELAY = 2.0 # Seconds before the first retry, doubled after every failed attempt
+
+log = logging.getLogger(__name__)
+
+
+class ExtractionItem:
+    __slots__ = ("user_id", "prompt", "mentioned_users", "guild_id", "generation")
+
+    def __init__(self, user_id: str, prompt: str, mentioned_users: list, guild_id: str = "", generation: int = 0):
+        self.user_id = user_id
+        self.prompt = prompt
+        self.mentioned_users = mentioned_users
+        self.guild_id = guild_id
+        self.generation = generation
+
+
+# Background stage that extracts long-term memory facts after the reply was sent.
+# extract(items) is a coroutine function returning one list of extracted infos per item.
+# apply(item, infos) saves the result. It is a plain function, so each update is applied without
+# any other handler running in between. forget(guild_id, user_id) discards the user's queued and in-flight messages.
+class ExtractionPipeline:
+    def __init__(self, extract, apply, batch_size: int, queue_size: int = EXTRACTION_QUEUE_SIZE,
+                 retries: int = EXTRACTION_RETRIES, retry_delay: float = EXTRACTION_RETRY_DELAY):
+        self.extract = extract
+        self.apply = apply
+        self.batch_size = max(1, batch_size)
+        self.retries = max(1, retries)
+        self.retry_delay = retry_delay
+        self._generations = {}  # (guild_id, user_id) -> number of times forget() was called
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._worker = None
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    # Queue a message for extraction. Returns False if the queue is full and the message was skipped
+    def submit(self, user_id: str, prompt: str, mentioned_users: list = (), guild_id: str = ""):
+        self.start()
+        try:
+            generation = self._generations.get((guild_id, user_id), 0)
+            self._queue.put_nowait(ExtractionItem(user_id, prompt, list(mentioned_users), guild_id, generation))
+            return True
+        except asyncio.QueueFull:
+            metrics.increment("extraction_dropped")
+            log.warning("Extraction queue is full, skipping message from %s.", user_id)
+            return False
+
+    # Discard the messages of a user that are queued or being extracted, for example after their memory was cleared
+    def forget(self, guild_id: str, user_id: str):
+        key = (guild_id, user_id)
+        self._generations[key] = self._generations.get(key, 0) + 1
+
+    # False if the item's user was forgotten after it was queued
+    def _is_current(self, item: ExtractionItem):
+        return item.generation == self._generations.get((item.guild_id, item.user_id), 0)
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            # Take whatever else is already waiting, so a backed up queue is handled in fewer prompts
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                items = [item for item in batch if self._is_current(item)]
+                if not items:
+                    continue
+                with metrics.span("extraction"):
+                    results = await self._extract_with_retries(items)
+                if results is not None:
+                    metrics.increment("extraction_messages", len(items))
+                    for item, infos in zip(items, results):
+                        # Checked again, the user may have been forgotten while the model was extracting
+                        if not self._is_current(item):
+                            continue
+                        try:
+                            self.apply(item, infos)
+                        except Exception as e:
+                            log.exception("Failed to save extracted info of %s: %s", item.user_id, e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _extract_with_retries(self, batch):
+        delay = self.retry_delay
+        for attempt in range(1, self.retries + 1):
+            try:
+                return await self.extract(batch)
+            except Exception as e:
+                log.warning("Extraction attempt %d/%d failed: %s", attempt, self.retries, e)
+                if attempt < self.retries:
+                    await asyncio.sleep(delay)
+                    delay *= 2
+        metrics.increment("extraction_failed", len(batch))
+        return None
+
+    # Wait (up to timeout seconds) for queued messages to be processed, then stop the worker
+    async def close(self, timeout: float = 30):
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            log.warning("Extraction did not finish in time, %d messages skipped.", self._queue.qsize())
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
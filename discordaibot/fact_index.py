@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+
+try:
+    import numpy as np
+except ImportError:  # Semantic memory is optional, the bot falls back to injecting whole memory sections
+    np = None
+
+# Configuration
+LOCAL_EMBEDDING_DIM = 256  # Vector size of the local stand-in embedder
+
+log = logging.getLogger(__name__)
+
+
+# Facts of one long-term memory entry as "key: value" lines. List values become one fact per item
+def fact_texts(memory: dict):
+    texts = []
+    for key, value in memory.items():
+        for item in value if isinstance(value, list) else [value]:
+            texts.append(f"{key}: {item}")
+    return texts
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# Small local stand-in for an embedding model: hashed bag of words and character trigrams.
+# No model needed and deterministic between runs, but it only knows about shared words, not meaning.
+class HashingEmbedder:
+    def __init__(self, dim: int = LOCAL_EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"local-hashing-{dim}"
+
+    def _embed_one(self, text: str):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            features = [word] + [word[i:i + 3] for i in range(len(word) - 2)]
+            for feature in features:
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                index = int.from_bytes(digest[:4], "little") % self.dim
+                vector[index] += 1.0 if digest[4] & 1 else -1.0
+        return vector
+
+    async def embed(self, texts: list):
+        return _normalize(np.stack([self._embed_one(text) for text in texts]))
+
+
+# Embeddings from the local Ollama server (/api/embeddings)
+class OllamaEmbedder:
+    def __init__(self, client, model: str):
+        self.client = client
+        self.model = model
+        self.name = model
+
+    async def embed(self, texts: list):
+        vectors = await asyncio.gather(*(self.client.embed(self.model, text) for text in texts))
+        return _normalize(np.asarray(vectors, dtype=np.float32))
+
+
+# NumPy-backed vector index over long-term memory facts.
+# Facts are embedded when they are added (embeddings are cached by text), and a prompt ranks
+# a user's facts by similarity with one matrix-vector product over just their rows.
+class FactIndex:
+    def __init__(self, embedder, cache_file: str):
+        self.embedder = embedder
+        self.cache_file = cache_file
+        self._cache = {}           # hash of embedder name + text -> vector
+        self._cache_dirty = False
+        self._rows = []            # (user_id, text) of every indexed fact, row i of the matrix
+        self._row_of = {}          # (user_id, text) -> row
+        self._user_texts = {}      # user_id -> set of indexed fact texts
+        self._matrix = None        # Fact vectors, grows by doubling
+        self._versions = {}        # Newest update per user, older in-flight updates are dropped
+        self._tasks = set()
+        self._load_cache()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _key(self, text: str):
+        return hashlib.sha1(f"{self.embedder.name}\0{text}".encode()).hexdigest()
+
+    def _load_cache(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with np.load(self.cache_file) as data:
+                for key, vector in zip(data["keys"], data["vectors"]):
+                    self._cache[str(key)] = vector
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("Failed to load embedding cache: %s", e)
+
+    # Save the embedding cache atomically (temp file + rename)
+    async def save(self):
+        if not self._cache_dirty:
+            return
+        # Only keep embeddings of facts that are still indexed
+        live = {self._key(text) for _, text in self._rows}
+        self._cache = {key: vector for key, vector in self._cache.items() if key in live}
+        if not self._cache:
+            return
+        keys = np.array(list(self._cache.keys()))
+        vectors = np.stack(list(self._cache.values()))
+        self._cache_dirty = False
+
+        def write():
+            directory = os.path.dirname(os.path.abspath(self.cache_file))
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".npz")
+            try:
+                with os.fdopen(fd, "wb") as file:
+                    np.savez(file, keys=keys, vectors=vectors)
+                os.replace(temp_path, self.cache_file)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+        await asyncio.to_thread(write)
+
+    async def _vectors(self, texts: list):
+        missing = list({text for text in texts if self._key(text) not in self._cache})
+        if missing:
+            for text, vector in zip(missing, await self.embedder.embed(missing)):
+                self._cache[self._key(text)] = vector
+            self._cache_dirty = True
+        return [self._cache[self._key(text)] for text in texts]
+
+    def _append_row(self, user_id: str, text: str, vector):
+        size = len(self._rows)
+        if self._matrix is None:
+            self._matrix = np.zeros((16, len(vector)), dtype=np.float32)
+        elif size == len(self._matrix):
+            self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix)])
+        self._matrix[size] = vector
+        self._row_of[(user_id, text)] = size
+        self._rows.append((user_id, text))
+        self._user_texts.setdefault(user_id, set()).add(text)
+
+    # Remove a row by moving the last row into its place
+    def _remove_row(self, row: int):
+        last = len(self._rows) - 1
+        removed = self._rows[row]
+        if row != last:
+            moved = self._rows[last]
+            self._matrix[row] = self._matrix[last]
+            self._rows[row] = moved
+            self._row_of[moved] = row
+        self._rows.pop()
+        del self._row_of[removed]
+        self._user_texts[removed[0]].discard(removed[1])
+
+    # Make the index hold exactly these facts for the user. Only new facts are embedded
+    async def set_user_facts(self, user_id: str, texts: list):
+        version = self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        wanted = set(texts)
+        new_texts = [text for text in wanted if (user_id, text) not in self._row_of]
+        vectors = await self._vectors(new_texts) if new_texts else []
+        if self._versions[user_id] != version:
+            return  # A newer update for this user arrived while embedding
+
+        stale = [self._row_of[(user_id, text)] for text in self._user_texts.get(user_id, ()) if text not in wanted]
+        for row in sorted(stale, reverse=True):
+            self._remove_row(row)
+        for text, vector in zip(new_texts, vectors):
+            self._append_row(user_id, text, vector)
+
+    # Memory listener: re-index the user's facts in the background
+    def on_memory_change(self, user_id: str, memory):
+        task = asyncio.get_running_loop().create_task(self._update(user_id, fact_texts(memory) if memory else []))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _update(self, user_id: str, texts: list):
+        try:
+            await self.set_user_facts(user_id, texts)
+        except Exception as e:
+            log.warning("Failed to index facts of %s: %s", user_id, e)
+
+    # Index everything in the memory store (embeddings come from the cache where possible)
+    async def build(self, memory_store):
+        await self.set_user_facts("bot", fact_texts(memory_store.get_bot_memory()))
+        for user_id, memory in memory_store.iter_user_memories():
+            await self.set_user_facts(user_id, fact_texts(memory))
+        await self.save()
+
+    # Embed a prompt once, so it can be used for several searches
+    async def embed_query(self, query: str):
+        return (await self.embedder.embed([query]))[0]
+
+    # The user's facts in texts, most similar to the query vector first. Facts that are not indexed yet keep their order at the end
+    def rank(self, query_vector, user_id: str, texts: list):
+        indexed = [text for text in texts if (user_id, text) in self._row_of]
+        if not indexed:
+            return list(texts)
+        scores = self._matrix[[self._row_of[(user_id, text)] for text in indexed]] @ query_vector
+        ranked = [indexed[i] for i in np.argsort(-scores, kind="stable")]
+        return ranked + [text for text in texts if (user_id, text) not in self._row_of]
+
+    async def close(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.save()
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import time
+
+from .observability import metrics
+
+# Configuration
+SHARD_SWEEP_INTERVAL = 60  # Seconds between checks for idle guilds to unload
+
+log = logging.getLogger(__name__)
+
+
+# Guild ID used for memory: the server's ID, "" for direct messages
+def guild_key(guild):
+    return str(guild.id) if guild is not None else ""
+
+
+# Memory of one guild: its store and everything built on top of it
+class GuildMemory:
+    def __init__(self, guild_id: str, store, name_index, fact_index=None, history=None, compactor=None):
+        self.guild_id = guild_id
+        self.store = store
+        self.name_index = name_index
+        self.fact_index = fact_index
+        self.history = history
+        self.compactor = compactor
+        self.tasks = []  # Background tasks to cancel when the guild is unloaded (for example building the fact index)
+        self.pins = 0
+        self.last_used = time.monotonic()
+
+    # Something still works with this guild's memory, so it must not be unloaded
+    @property
+    def busy(self):
+        return self.pins > 0 or (self.history is not None and self.history.pending)
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.compactor is not None:
+            await self.compactor.close()
+        if self.history is not None:
+            await self.history.close()
+        if self.fact_index is not None:
+            await self.fact_index.close()
+        await self.store.close()
+
+
+# Memory split by guild. A guild's memory is loaded by factory(guild_id) the first time it is used
+# and unloaded again after idle_timeout seconds without use, so only active guilds take up RAM.
+# acquire() pins the guild until release(), so memory that a message is still working with is never unloaded.
+class GuildShards:
+    def __init__(self, factory, idle_timeout: float, sweep_interval: float = SHARD_SWEEP_INTERVAL):
+        self.factory = factory
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self._shards = {}
+        self._sweeper = None
+
+    def __len__(self):
+        return len(self._shards)
+
+    # Loaded guilds
+    def __iter__(self):
+        return iter(list(self._shards.values()))
+
+    # Memory of a guild, loaded if needed. Must be given back with release()
+    def acquire(self, guild_id: str):
+        shard = self._shards.get(guild_id)
+        if shard is None:
+            shard = self.factory(guild_id)
+            self._shards[guild_id] = shard
+            metrics.increment("guild_memory_loads")
+            self._start()
+        shard.pins += 1
+        shard.last_used = time.monotonic()
+        return shard
+
+    def release(self, shard: GuildMemory):
+        shard.pins -= 1
+        shard.last_used = time.monotonic()
+
+    def _start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep())
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                log.exception("Failed to unload idle guild memory: %s", e)
+
+    # Unload guilds that were not used for idle_timeout seconds. Returns the number unloaded
+    async def evict_idle(self):
+        evicted = 0
+        now = time.monotonic()
+        for guild_id, shard in list(self._shards.items()):
+            if shard.busy or now - shard.last_used < self.idle_timeout:
+                continue
+            # The compactor's timer doesn't survive a guild that is unloaded sooner, so compact what changed first
+            if shard.compactor is not None:
+                try:
+                    await shard.compactor.run_once()
+                except Exception as e:
+                    log.exception("Memory compaction of guild %s failed: %s", guild_id, e)
+            # Write pending changes while the guild is still loaded, then check nobody picked it up meanwhile
+            if not await shard.store.flush():
+                continue
+            if shard.busy or shard.last_used > now or shard.store.dirty or self._shards.get(guild_id) is not shard:
+                continue
+            del self._shards[guild_id]
+            await shard.close()
+            evicted += 1
+        metrics.increment("guild_memory_evictions", evicted)
+        if evicted:
+            log.info("Unloaded memory of %d idle guilds, %d still loaded", evicted, len(self._shards))
+        return evicted
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        shards = list(self._shards.values())
+        self._shards.clear()
+        for shard in shards:
+            await shard.close()
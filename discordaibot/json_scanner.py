@@ -0,0 +1,90 @@
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+
+# Incremental scanner for JSON objects in model output. Feed it the response piece by piece as it streams in:
+# it keeps track of nesting, strings and escapes, skips // and /* */ comments and any text between objects,
+# and parses each top-level object as soon as its closing brace arrives.
+# Objects that still aren't valid JSON, or whose brackets don't match, are skipped and the scanner goes on with the next one.
+class JsonObjectScanner:
+    def __init__(self):
+        self.objects = []    # Every object parsed so far
+        self.skipped = 0     # Complete objects that were not valid JSON
+        self._buffer = []    # Characters of the object being read
+        self._stack = []     # Closing brackets expected by the open objects and arrays, innermost last
+        self._in_string = False
+        self._escape = False
+        self._slash = False  # Last character was "/" outside a string, it may start a comment
+        self._comment = None  # "//" or "/*" while inside a comment
+        self._star = False   # Last character inside a block comment was "*"
+
+    # Scan the next piece of text. Returns the objects completed by it
+    def feed(self, text: str):
+        completed = []
+        for char in text:
+            if self._comment == "//":
+                if char == "\n":
+                    self._comment = None
+                continue
+            if self._comment == "/*":
+                if self._star and char == "/":
+                    self._comment = None
+                self._star = char == "*"
+                continue
+            if not self._stack:
+                # Text outside of objects (explanations, code fences, trailing garbage) is ignored
+                if char == "{":
+                    self._buffer = [char]
+                    self._stack = ["}"]
+                continue
+            if self._in_string:
+                self._buffer.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if self._slash:
+                self._slash = False
+                if char in "/*":
+                    self._comment = "/" + char
+                    self._star = False
+                    continue
+                self._buffer.append("/")
+            if char == "/":
+                self._slash = True
+                continue
+
+            self._buffer.append(char)
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append("}" if char == "{" else "]")
+            elif char in "}]":
+                if char != self._stack.pop():
+                    # Mismatched bracket: the object can't be valid, look for the next one
+                    log.debug("Mismatched %r in JSON block", char)
+                    self._stack = []
+                    self._buffer = []
+                    self.skipped += 1
+                elif not self._stack:
+                    parsed = self._finish()
+                    if parsed is not None:
+                        completed.append(parsed)
+        return completed
+
+    def _finish(self):
+        block = "".join(self._buffer)
+        self._buffer = []
+        try:
+            parsed = json.loads(block)
+        except json.JSONDecodeError as e:
+            log.debug("Error parsing JSON block: %s", e)
+            self.skipped += 1
+            return None
+        self.objects.append(parsed)
+        return parsed
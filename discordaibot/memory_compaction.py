@@ -0,0 +1,198 @@
+import asyncio
+import difflib
+import json
+import logging
+
+from .context_builder import estimate_tokens
+
+# Configuration
+SIMILARITY_THRESHOLD = 0.9   # Values at least this similar (0-1) count as duplicates...
+WORD_SIMILARITY = 0.8        # ...if each of their words matches the word at the same place at least this closely
+SUMMARY_KEY = "summary"      # Key that holds the summary of compacted facts
+KEY_IMPORTANCE = {"preference": 2.0, "fact": 2.0, "project": 1.5}  # Other keys have importance 1
+KEPT_KEYS = ("name", "alias", "aliases", "nickname", SUMMARY_KEY)  # Never summarized away
+
+log = logging.getLogger(__name__)
+
+
+# Case and spacing don't matter, punctuation only at the ends ("C++" and "C#" stay different)
+def normalize_value(value):
+    return " ".join(str(value).casefold().split()).strip(" .,;:!?\"'")
+
+
+# True if two values say the same thing: equal after normalizing, or the same words in the same order
+# with only small spelling differences ("colour"/"color"). Numbers must match exactly, and a value
+# containing another one ("vegan"/"not vegan", "likes"/"dislikes") is a different fact.
+def is_duplicate(a, b, threshold: float = SIMILARITY_THRESHOLD):
+    a, b = normalize_value(a), normalize_value(b)
+    if a == b:
+        return True
+    words_a, words_b = a.split(), b.split()
+    if len(words_a) != len(words_b):
+        return False
+    for word_a, word_b in zip(words_a, words_b):
+        if word_a == word_b:
+            continue
+        if any(char.isdigit() for char in word_a + word_b):
+            return False
+        if difflib.SequenceMatcher(None, word_a, word_b).ratio() < WORD_SIMILARITY:
+            return False
+    return difflib.SequenceMatcher(None, a, b).ratio() >= threshold
+
+
+# Drop duplicate values, keeping the newest (last) wording of each
+def dedupe_values(values: list, threshold: float = SIMILARITY_THRESHOLD):
+    kept = []
+    for value in values:
+        for i, existing in enumerate(kept):
+            if is_duplicate(existing, value, threshold):
+                kept.pop(i)
+                break
+        kept.append(value)
+    return kept
+
+
+# Add value to a memory entry key the way extraction merges facts, skipping it if an equivalent value is stored
+def merge_value(entry: dict, key: str, value):
+    if key not in entry:
+        entry[key] = value
+        return
+    values = entry[key] if isinstance(entry[key], list) else [entry[key]]
+    values = dedupe_values(values + [value])
+    entry[key] = values[0] if len(values) == 1 else values
+
+
+# (bytes, estimated tokens) of a memory entry
+def _size(memory: dict):
+    text = json.dumps(memory, ensure_ascii=False)
+    return len(text.encode()), estimate_tokens(text)
+
+
+# Dedupe every key and pick the facts over the cap.
+# Returns (compacted memory, overflow facts as (key, value)) where overflow should be summarized.
+# Facts are scored by key importance plus recency within the key (later values are newer).
+def compact_memory(memory: dict, max_facts: int):
+    compacted = {}
+    scored = []
+    for key, value in memory.items():
+        if isinstance(value, list):
+            value = dedupe_values(value)
+            compacted[key] = value[0] if len(value) == 1 else value
+        else:
+            compacted[key] = value
+        if key in KEPT_KEYS:
+            continue
+        values = value if isinstance(value, list) else [value]
+        for i, item in enumerate(values):
+            scored.append((KEY_IMPORTANCE.get(key, 1.0) + (i + 1) / len(values), key, item))
+
+    overflow = []
+    if len(scored) > max_facts:
+        scored.sort(key=lambda fact: fact[0])
+        overflow = [(key, item) for _, key, item in scored[:len(scored) - max_facts]]
+    return compacted, overflow
+
+
+# Remove overflow facts from a memory entry
+def drop_facts(memory: dict, facts: list):
+    result = {}
+    for key, value in memory.items():
+        values = value if isinstance(value, list) else [value]
+        remaining = [item for item in values if (key, item) not in facts]
+        if remaining:
+            result[key] = remaining[0] if len(remaining) == 1 else remaining
+    return result
+
+
+# Background job that keeps long-term memory small: dedupes values and folds the least important facts of
+# users over max_facts into a short summary with summarize(name, facts, previous_summary), a coroutine function.
+# Only users whose memory changed since the last run are looked at.
+class MemoryCompactor:
+    def __init__(self, memory_store, summarize, max_facts: int, interval: float):
+        self.memory_store = memory_store
+        self.summarize = summarize
+        self.max_facts = max_facts
+        self.interval = interval
+        self.bytes_reclaimed = 0
+        self.tokens_reclaimed = 0
+        self._dirty = None  # None = every user (first run)
+        self._task = None
+        self._compacting = False
+
+    # Memory listener
+    def on_memory_change(self, user_id: str, memory):
+        if self._dirty is not None and memory is not None and not self._compacting:
+            self._dirty.add(user_id)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                log.exception("Memory compaction failed: %s", e)
+
+    async def run_once(self):
+        if self._dirty is None:
+            user_ids = [user_id for user_id, _ in self.memory_store.iter_user_memories()]
+        else:
+            user_ids = list(self._dirty)
+        self._dirty = set()
+
+        bytes_reclaimed = tokens_reclaimed = 0
+        for user_id in user_ids:
+            (bytes_before, tokens_before), (bytes_after, tokens_after) = await self.compact_user(user_id)
+            bytes_reclaimed += bytes_before - bytes_after
+            tokens_reclaimed += tokens_before - tokens_after
+
+        if user_ids:
+            self.bytes_reclaimed += bytes_reclaimed
+            self.tokens_reclaimed += tokens_reclaimed
+            log.info("Compacted %d users, reclaimed %d bytes (~%d tokens)", len(user_ids), bytes_reclaimed, tokens_reclaimed)
+        return bytes_reclaimed, tokens_reclaimed
+
+    # Compact one user. Returns (bytes, tokens) of their memory before and after
+    async def compact_user(self, user_id: str):
+        memory = self.memory_store.get_user_memory(user_id)
+        if not memory:
+            return (0, 0), (0, 0)
+        before = _size(memory)
+        compacted, overflow = compact_memory(memory, self.max_facts)
+
+        if overflow:
+            facts = [f"{key}: {item}" for key, item in overflow]
+            try:
+                summary = await self.summarize(memory.get("name", ""), facts, memory.get(SUMMARY_KEY, ""))
+            except Exception as e:
+                log.warning("Failed to summarize memory of %s: %s", user_id, e)
+                summary = None
+            # Memory may have changed while the model was summarizing, apply the result to the current version
+            memory = self.memory_store.get_user_memory(user_id)
+            if not memory:
+                return before, (0, 0)
+            compacted, _ = compact_memory(memory, self.max_facts)
+            if summary:
+                compacted = drop_facts(compacted, overflow)
+                compacted[SUMMARY_KEY] = summary.strip()
+
+        after = _size(compacted)
+        if compacted != memory:
+            self._compacting = True  # Our own write doesn't make the user dirty again
+            try:
+                self.memory_store.set_user_memory(user_id, compacted)
+            finally:
+                self._compacting = False
+        return before, after
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,366 @@
+import asyncio
+import os
+import re
+import time
+
+from . import config, engine
+from .context_builder import ContextBuilder, estimate_tokens
+from .extraction_pipeline import ExtractionPipeline
+from .fact_index import FactIndex, HashingEmbedder, OllamaEmbedder, fact_texts, np
+from .guild_shards import GuildMemory, GuildShards, guild_key
+from .json_scanner import JsonObjectScanner
+from .memory_compaction import MemoryCompactor, merge_value
+from .memory_store import MemoryStore
+from .name_index import NameIndex, normalize_name
+from .observability import log, metrics, sampled
+from .ollama_client import frame_text, generation_options
+from .rolling_history import RollingHistory, format_turn
+from .sqlite_store import SqliteMemoryStore
+
+# Memory of the bot: chat history, long-term memory and everything that maintains them.
+# Only imported when config.MEMORY is on, so a bot without memory doesn't load numpy, SQLite or the indexes.
+
+# Embeddings for semantic memory, shared by the fact indexes of all servers
+embedder = None
+if config.SEMANTIC_MEMORY and np is None:
+    log.warning("numpy is not installed, semantic memory is disabled.")
+elif config.SEMANTIC_MEMORY:
+    embedder = OllamaEmbedder(engine.ollama, config.EMBEDDING_MODEL) if config.EMBEDDING_MODEL else HashingEmbedder()
+
+# Function to run an extraction prompt and parse the JSON objects in its answer while it streams in.
+# With EXTRACTION_JSON_FORMAT the answer is a single object, so the generation is stopped as soon as it is complete
+# instead of waiting for the model to finish. Connection errors are raised, so the extraction pipeline can retry
+async def extract_json_objects(data: dict):
+    if config.EXTRACTION_JSON_FORMAT:
+        data = {**data, "format": "json"}
+    scanner = JsonObjectScanner()
+    response_data = ""
+    stream = engine.ollama.stream_generate(data, "extraction")
+    try:
+        async for line_json in stream:
+            text = frame_text(line_json)
+            response_data += text
+            if scanner.feed(text) and config.EXTRACTION_JSON_FORMAT:
+                metrics.increment("extraction_stopped_early")
+                break
+    finally:
+        await stream.aclose()  # Closes the connection, which makes Ollama stop generating
+    
+    log.debug("Raw extraction response: %s", response_data)
+    if scanner.skipped:
+        log.info("Skipped %d invalid JSON objects in extraction response", scanner.skipped)
+    return scanner.objects
+
+# Function to extract important information from user input only
+async def extract_important_info(prompt: str):
+    data = {
+        "prompt": f"User: {prompt}",
+        "model": config.MODEL_NAME,  # Use the configured model
+        "options": generation_options(0.5, num_ctx=config.NUM_CTX),
+        "system": config.EXTRACTION_SYSTEM_PROMPT
+    }
+    extracted_infos = [info for info in await extract_json_objects(data) if isinstance(info, dict)]
+    log.debug("Extracted info: %s", extracted_infos)
+    return extracted_infos
+
+# Function to extract important information from several messages with one prompt.
+# Returns one list of extracted infos per message
+async def extract_important_info_batch(items: list):
+    if len(items) == 1:
+        return [await extract_important_info(items[0].prompt)]
+    
+    numbered_messages = "\n".join([f"Message {i}: {item.prompt}" for i, item in enumerate(items, start=1)])
+    data = {
+        "prompt": f"{config.EXTRACTION_BATCH_INSTRUCTIONS}\n{numbered_messages}",
+        "model": config.MODEL_NAME,  # Use the configured model
+        "options": generation_options(0.5, num_ctx=config.NUM_CTX),
+        "system": config.EXTRACTION_SYSTEM_PROMPT
+    }
+    
+    # The answer should be one object wrapping the per-message objects
+    objects = await extract_json_objects(data)
+    batch_info = objects[0] if objects else None
+    if not isinstance(batch_info, dict) or (batch_info and not any(str(i) in batch_info for i in range(1, len(items) + 1))):
+        # Model didn't follow the batch format, extract the messages one by one instead
+        log.info("Batch extraction didn't return numbered objects, extracting messages separately.")
+        return [await extract_important_info(item.prompt) for item in items]
+    
+    results = []
+    for i in range(1, len(items) + 1):
+        info = batch_info.get(str(i))
+        results.append([info] if isinstance(info, dict) and info else [])
+    return results
+
+# Function to save extracted information into the long-term memory of a server.
+# Runs without awaiting anything, so the whole update is applied at once
+def save_extracted_info(memory: GuildMemory, user_id: str, mentioned_users: list, extracted_infos: list):
+    if extracted_infos:
+        for important_info in extracted_infos:
+            # If the extracted info is not user-specific, associate it with the current user
+            if "name" not in important_info:
+                log.debug("No name found in extracted info. Associating with current user.")
+                target_user_id = user_id  # Use the current user's ID
+            else:
+                extracted_name = normalize_name(important_info.get("name", ""))
+                target_user_id = None
+
+                # Priority 1: Check mentioned users in the prompt
+                if mentioned_users:
+                    target_user_id = mentioned_users[0]  # Use the first mentioned user's ID
+                    log.debug("Using mentioned user ID: %s", target_user_id)
+
+                # Priority 2: Look the name up in the name index (name_to_id mapping, then names and aliases
+                # stored in users' memory, then prefix and fuzzy matches)
+                if not target_user_id and extracted_name:
+                    target_user_id = memory.name_index.lookup(extracted_name)
+                    if target_user_id:
+                        log.debug("Found existing user %s with name '%s'", target_user_id, extracted_name)
+
+                # Fallback: Current user's ID
+                if not target_user_id:
+                    target_user_id = user_id  # Use the current user's ID
+                    log.debug("Fallback to current user ID: %s", user_id)
+
+                # Update name_to_id mapping if we found a better match
+                if extracted_name and target_user_id:
+                    current_mapping = memory.name_index.get_alias(extracted_name)
+                    if current_mapping != target_user_id:
+                        memory.store.set_name_mapping(extracted_name, target_user_id)
+                        memory.name_index.set_alias(extracted_name, target_user_id)
+                        log.debug("Updated name_to_id mapping: %s -> %s", extracted_name, target_user_id)
+
+            # Store information in the identified user's record
+            if target_user_id not in ("bot", "name_to_id"):  # Ensure we're not storing in the special sections
+                user_entry = dict(memory.store.get_user_memory(target_user_id) or {})
+                for key, value in important_info.items():
+                    if key != "name" and value:  # Skip empty fields
+                        # Add the value, or turn the key into a list of values. Values that repeat a stored one are skipped
+                        merge_value(user_entry, key, value)
+
+                # Special case: Ensure name is stored in the user's entry
+                if "name" in important_info and "name" not in user_entry:
+                    user_entry["name"] = important_info["name"].capitalize()
+
+                memory.store.set_user_memory(target_user_id, user_entry)
+
+# Function to save the extracted information of a queued message into its server's memory
+def apply_extracted_info(item, extracted_infos: list):
+    memory = shards.acquire(item.guild_id)
+    try:
+        save_extracted_info(memory, item.user_id, item.mentioned_users, extracted_infos)
+    finally:
+        shards.release(memory)
+
+# Extraction runs in the background. Batches wait in the scheduler like any other user's prompt
+extraction = ExtractionPipeline(
+    lambda items: engine.scheduler.run("extraction", lambda: extract_important_info_batch(items)),
+    apply_extracted_info,
+    config.EXTRACTION_BATCH_SIZE,
+)
+
+# Function to summarize facts that no longer fit into a user's long-term memory
+async def summarize_facts(name: str, facts: list, previous_summary: str = ""):
+    prompt = ""
+    if name:
+        prompt += f"User: {name}\n"
+    if previous_summary:
+        prompt += f"Earlier summary: {previous_summary}\n"
+    prompt += "Facts:\n" + "\n".join(facts)
+    data = {
+        "prompt": prompt,
+        "model": config.MODEL_NAME,  # Use the configured model
+        "options": generation_options(0.3, num_ctx=config.NUM_CTX),
+        "system": config.SUMMARY_SYSTEM_PROMPT
+    }
+    response_data = await engine.ollama.generate(data, "compaction")
+    return engine.process_think_section(response_data)
+
+# Function to fold older chat messages into the running summary of a user's conversation
+async def summarize_history(previous_summary: str, turns: list):
+    prompt = ""
+    if previous_summary:
+        prompt += f"Summary so far: {previous_summary}\n\n"
+    prompt += "Messages:\n" + "\n".join(turns)
+    data = {
+        "prompt": prompt,
+        "model": config.MODEL_NAME,  # Use the configured model
+        "options": generation_options(0.3, num_ctx=config.NUM_CTX),
+        "system": config.HISTORY_SUMMARY_SYSTEM_PROMPT
+    }
+    response_data = await engine.ollama.generate(data, "history")
+    return engine.process_think_section(response_data)
+
+# File of a server's memory. Direct messages (and all servers when GUILD_MEMORY is off) use the configured file itself
+def guild_file(guild_id: str, file_name: str):
+    if not guild_id:
+        return file_name
+    directory = os.path.join(config.MEMORY_DIR, guild_id)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, os.path.basename(file_name))
+
+# Function to load the memory of one server, called the first time the server is used
+def load_guild_memory(guild_id: str):
+    # Chat history and long-term memory.
+    # JSON: loaded once, kept in memory and written back to the server's files in the background.
+    # SQLite: one database for every server, every change only touches the rows of the affected users.
+    if config.STORAGE_BACKEND == "sqlite":
+        store = SqliteMemoryStore(config.SQLITE_DB_FILE, guild_id)
+    else:
+        store = MemoryStore(guild_file(guild_id, config.CHAT_HISTORY_FILE), guild_file(guild_id, config.LONG_TERM_MEMORY_FILE))
+
+    # Names and aliases of users, for resolving names found by extraction without scanning every user
+    names = NameIndex()
+    names.build(store)
+    store.add_memory_listener(names.on_memory_change)
+
+    if engine.response_cache is not None:
+        store.add_memory_listener(lambda user_id, memory: engine.response_cache.invalidate_user(user_id))
+
+    # Vector index over long-term memory facts, kept up to date whenever memory changes
+    facts = None
+    if embedder is not None:
+        facts = FactIndex(embedder, guild_file(guild_id, config.EMBEDDING_CACHE_FILE))
+        store.add_memory_listener(facts.on_memory_change)
+
+    # Chat history as recent messages within HISTORY_TOKEN_BUDGET plus a summary of the older ones.
+    # Summaries are written in the background and wait in the scheduler like extraction does
+    history = RollingHistory(
+        store,
+        lambda previous_summary, turns: engine.scheduler.run("history", lambda: summarize_history(previous_summary, turns)),
+        config.HISTORY_TOKEN_BUDGET,
+        config.HISTORY_SUMMARY_TOKENS,
+    )
+
+    # Keeps long-term memory small. Runs in the background and waits in the scheduler like extraction does
+    compactor = MemoryCompactor(
+        store,
+        lambda name, facts, previous_summary: engine.scheduler.run("compaction", lambda: summarize_facts(name, facts, previous_summary)),
+        config.MEMORY_MAX_FACTS_PER_USER,
+        config.MEMORY_COMPACTION_INTERVAL,
+    )
+    store.add_memory_listener(compactor.on_memory_change)
+    compactor.start()
+
+    memory = GuildMemory(guild_id, store, names, facts, history, compactor)
+    if facts is not None:
+        # Index long-term memory in the background, cached embeddings make this quick after the first load
+        memory.tasks.append(asyncio.create_task(facts.build(store)))
+    return memory
+
+# Memory of each server, loaded on first use and unloaded again when the server is idle
+shards = GuildShards(load_guild_memory, config.SHARD_IDLE_TIMEOUT)
+
+# Function to extract user ID from a mention
+def extract_user_id_from_mention(mention: str):
+    # Extract the user ID from a Discord mention (e.g., <@123456789012345678> or <@!123456789012345678>)
+    match = re.match(r'<@!?(\d+)>', mention)
+    if match:
+        return match.group(1)
+    return None
+
+# Function to order the memory facts of a user for the prompt. Every fact is offered, the context budget
+# decides how many fit. With semantic memory the name comes first, then the facts most relevant to the prompt,
+# so the least relevant ones are the first to be trimmed
+def select_facts(fact_index, user_id: str, memory: dict, query_vector):
+    lines = fact_texts(memory)
+    if query_vector is None or len(lines) < 2:
+        return lines
+    names = [line for line in lines if line.startswith("name: ")]
+    return names + fact_index.rank(query_vector, user_id, [line for line in lines if line not in names])
+
+# Memory of the server a command was used in (direct messages have their own). Must be given back with shards.release()
+def acquire(guild):
+    return shards.acquire(guild_key(guild) if config.GUILD_MEMORY else "")
+
+# Function to find the users mentioned in a prompt (<@id> or <@!id>)
+def mentioned_user_ids(prompt: str):
+    mentioned_users = []
+    for word in prompt.split():
+        if word.startswith("<@") and word.endswith(">"):
+            mentioned_user_id = extract_user_id_from_mention(word)
+            if mentioned_user_id and mentioned_user_id not in mentioned_users:
+                mentioned_users.append(mentioned_user_id)
+    return mentioned_users
+
+# Function to build the context of a prompt from the long-term memory of the current user, mentioned users and the bot,
+# plus the current user's chat history. Nobody else's memory ends up in the prompt.
+# Returns (context text, history turns to send as chat messages or None, mentioned user IDs).
+# fetch_user(user_id) is a coroutine returning the Discord user, used for the names of mentioned users
+async def build_context(memory: GuildMemory, user, prompt: str, fetch_user):
+    user_id = str(user.id)
+    context = ContextBuilder(config.CONTEXT_TOKEN_BUDGET)
+    context_started = time.perf_counter()
+    
+    # Get the current user's chat history: summary of older messages and the recent ones word for word
+    history_summary, recent_history = memory.history.window(user_id)
+    mentioned_users = mentioned_user_ids(prompt)
+    
+    # Embed the prompt for ranking facts by relevance
+    fact_index = memory.fact_index
+    query_vector = None
+    if fact_index is not None and len(fact_index):
+        try:
+            query_vector = await asyncio.wait_for(fact_index.embed_query(prompt), config.EMBEDDING_QUERY_TIMEOUT)
+        except asyncio.TimeoutError:
+            log.warning("Embedding the prompt took longer than %ss, using facts in stored order", config.EMBEDDING_QUERY_TIMEOUT)
+        except Exception as e:
+            log.warning("Semantic memory ranking failed, using facts in stored order: %s", e)
+    
+    # Prioritize the current user's long-term memory
+    user_memory = memory.store.get_user_memory(user_id)
+    if user_memory is not None:
+        context.add_section(user_id, f"Long-Term Memory for {user.name}:",
+                            select_facts(fact_index, user_id, user_memory, query_vector), priority=3)
+    
+    # Add long-term memory for mentioned users
+    for mentioned_user_id in mentioned_users:
+        mentioned_memory = memory.store.get_user_memory(mentioned_user_id)
+        if mentioned_memory is not None and mentioned_user_id != user_id:
+            mentioned_user = await fetch_user(int(mentioned_user_id))
+            context.add_section(mentioned_user_id, f"Long-Term Memory for {mentioned_user.name}:",
+                                select_facts(fact_index, mentioned_user_id, mentioned_memory, query_vector), priority=1)
+    
+    # Add bot's long-term memory
+    context.add_section("bot", "Bot's Long-Term Memory:",
+                        select_facts(fact_index, "bot", memory.store.get_bot_memory(), query_vector))
+    
+    # Chat history goes last. It is trimmed right after the current user's memory, oldest messages first
+    if history_summary:
+        context.add_section("history_summary", "Earlier in this conversation:", [history_summary], priority=2)
+    context.add_section("history", "", [format_turn(msg) for msg in recent_history],
+                        priority=2, keep_newest=True, dedupe=False)
+    
+    # In chat mode the history that fits into the budget is sent as separate messages instead of context text
+    history_turns = None
+    if config.OLLAMA_API == "chat":
+        full_context = context.build(exclude=("history",))
+        kept_history = len(context.kept_lines("history"))
+        history_turns = recent_history[len(recent_history) - kept_history:]
+    else:
+        full_context = context.build()
+    metrics.observe("context_build", time.perf_counter() - context_started)
+    metrics.observe("context_tokens", estimate_tokens(full_context))
+    metrics.increment("context_tokens_saved", context.saved_tokens)
+    if sampled(config.LOG_SAMPLE_RATE):
+        log.info("Context: %d tokens, saved %d (%d duplicate, %d over budget)", estimate_tokens(full_context),
+                 context.saved_tokens, context.duplicate_tokens, context.trimmed_tokens)
+    return full_context, history_turns, mentioned_users
+
+# Function to forget everything about a user in one server
+def clear_user(memory: GuildMemory, user_id: str):
+    extraction.forget(memory.guild_id, user_id)  # Messages still waiting for extraction would bring facts back
+    memory.store.clear_user(user_id)
+    if engine.response_cache is not None:
+        engine.response_cache.invalidate_user(user_id)
+
+# Lines about memory for /queue
+def status_lines(memory: GuildMemory):
+    return [
+        f"Messages waiting for memory extraction: {len(extraction)}",
+        f"Memory compaction reclaimed here: {memory.compactor.bytes_reclaimed / 1000:.1f} kB (~{memory.compactor.tokens_reclaimed} tokens)",
+        f"Servers with memory loaded: {len(shards)}",
+    ]
+
+async def close():
+    await extraction.close()  # Finish extracting messages that are still queued
+    await shards.close()  # Write and unload the memory of every loaded server
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+
+from .observability import metrics
+
+# Configuration
+FLUSH_DELAY = 2.0  # Seconds to collect changes before they are written to disk
+
+log = logging.getLogger(__name__)
+
+
+# Write text to path atomically: write a temp file in the same folder, then rename it over the old file.
+# A crash in the middle of a write leaves the previous file intact instead of a truncated one.
+def atomic_write(path: str, text: str):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _load_json(path: str, default):
+    if os.path.exists(path):
+        with open(path, "r") as file:
+            return json.load(file)
+    return default
+
+
+# Chat history and long-term memory kept resident in memory.
+# Every handler reads and changes the same dicts, so concurrent messages can't overwrite
+# each other's changes. Changes are written back by a debounced background writer.
+class MemoryStore:
+    def __init__(self, chat_history_file: str, long_term_memory_file: str, flush_delay: float = FLUSH_DELAY):
+        self.chat_history_file = chat_history_file
+        self.long_term_memory_file = long_term_memory_file
+        self.flush_delay = flush_delay
+        self.chat_history = _load_json(chat_history_file, {})
+        # Initialize with a "bot" section and a name-to-ID mapping
+        self.long_term_memory = _load_json(long_term_memory_file, {"bot": {}, "name_to_id": {}})
+        self.writes = 0
+        self.bytes_written = 0
+        self._dirty_history = False
+        self._dirty_memory = False
+        self._flush_task = None
+        self._flush_now = asyncio.Event()
+        self._memory_listeners = []
+
+    # callback(user_id, memory) is called whenever a user's long-term memory changes. memory is None when it was removed
+    def add_memory_listener(self, callback):
+        self._memory_listeners.append(callback)
+
+    def _memory_changed(self, user_id: str, memory):
+        for callback in self._memory_listeners:
+            callback(user_id, memory)
+
+    # ---- Chat history ----
+
+    def has_history(self, user_id: str):
+        return user_id in self.chat_history
+
+    def get_history(self, user_id: str):
+        return list(self.chat_history.get(user_id, []))
+
+    # Add turns to the user's history and keep only the last max_messages
+    def append_history(self, user_id: str, turns: list, max_messages: int):
+        history = self.chat_history.setdefault(user_id, [])
+        history.extend(turns)
+        self.chat_history[user_id] = history[-max_messages:]
+        self._mark_dirty(history=True)
+
+    # Summary of the user's older turns, kept in a "summaries" section of the chat history file
+    def get_history_summary(self, user_id: str):
+        return self.chat_history.get("summaries", {}).get(user_id, "")
+
+    # Replace the oldest turns with a new summary. Returns False if the history no longer starts with turns
+    def fold_history(self, user_id: str, turns: list, summary: str):
+        history = self.chat_history.get(user_id, [])
+        if not turns or history[:len(turns)] != turns:
+            return False
+        self.chat_history[user_id] = history[len(turns):]
+        self.chat_history.setdefault("summaries", {})[user_id] = summary
+        self._mark_dirty(history=True)
+        return True
+
+    # ---- Long-term memory ----
+
+    def get_bot_memory(self):
+        return self.long_term_memory.get("bot", {})
+
+    def get_user_memory(self, user_id: str):
+        if user_id in ("bot", "name_to_id"):
+            return None
+        return self.long_term_memory.get(user_id)
+
+    # (user_id, memory) for every user with long-term memory
+    def iter_user_memories(self):
+        for user_id, memory in self.long_term_memory.items():
+            if user_id not in ("bot", "name_to_id"):
+                yield user_id, memory
+
+    def set_user_memory(self, user_id: str, memory: dict):
+        if user_id in ("bot", "name_to_id"):  # Never overwrite the special sections
+            return
+        self.long_term_memory[user_id] = memory
+        self._mark_dirty(memory=True)
+        self._memory_changed(user_id, memory)
+
+    def iter_name_mappings(self):
+        return iter(list(self.long_term_memory.get("name_to_id", {}).items()))
+
+    def set_name_mapping(self, name: str, user_id: str):
+        self.long_term_memory.setdefault("name_to_id", {})[name] = user_id
+        self._mark_dirty(memory=True)
+
+    # Remove the user's chat history and long-term memory
+    def clear_user(self, user_id: str):
+        if user_id in self.chat_history:
+            del self.chat_history[user_id]
+            self._mark_dirty(history=True)
+        if self.chat_history.get("summaries", {}).pop(user_id, None) is not None:
+            self._mark_dirty(history=True)
+        if self.get_user_memory(user_id) is not None:
+            del self.long_term_memory[user_id]
+            self._mark_dirty(memory=True)
+            self._memory_changed(user_id, None)
+
+    # ---- Persistence ----
+
+    # True while there are changes that are not written yet
+    @property
+    def dirty(self):
+        return self._dirty_history or self._dirty_memory
+
+    def _mark_dirty(self, history: bool = False, memory: bool = False):
+        self._dirty_history |= history
+        self._dirty_memory |= memory
+        if self._flush_task is not None and not self._flush_task.done():
+            return  # A flush is already scheduled and will pick this change up
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (for example a migration script), write right away
+            self._write(self._snapshot())
+            return
+        self._flush_task = loop.create_task(self._delayed_flush())
+
+    # Collect changes for flush_delay seconds, then write them. Keeps going while new changes arrive during a write
+    async def _delayed_flush(self):
+        while self._dirty_history or self._dirty_memory:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.flush_delay)
+            except asyncio.TimeoutError:
+                pass
+            if not await self.flush() and self._flush_now.is_set():
+                break  # Shutting down and the disk keeps failing, don't spin
+
+    # Serialize in the event loop so the snapshot is consistent, write the files in a worker thread
+    def _snapshot(self):
+        snapshot = []
+        if self._dirty_history:
+            snapshot.append((self.chat_history_file, json.dumps(self.chat_history, indent=4)))
+        if self._dirty_memory:
+            snapshot.append((self.long_term_memory_file, json.dumps(self.long_term_memory, indent=4)))
+        self._dirty_history = False
+        self._dirty_memory = False
+        return snapshot
+
+    def _write(self, snapshot):
+        for path, text in snapshot:
+            atomic_write(path, text)
+            self.writes += 1
+            self.bytes_written += len(text)
+            metrics.increment("memory_writes")
+            metrics.increment("memory_bytes_written", len(text))
+
+    # Write pending changes. Returns False if writing failed
+    async def flush(self):
+        snapshot = self._snapshot()
+        if not snapshot:
+            return True
+        try:
+            with metrics.span("persistence"):
+                await asyncio.to_thread(self._write, snapshot)
+            return True
+        except OSError as e:
+            log.error("Failed to save memory: %s", e)
+            # Keep the changes dirty so the next flush tries again
+            self._dirty_history |= any(path == self.chat_history_file for path, _ in snapshot)
+            self._dirty_memory |= any(path == self.long_term_memory_file for path, _ in snapshot)
+            return False
+
+    # Forced flush on shutdown. Wakes the writer instead of cancelling it, so a write in progress is never cut off
+    async def close(self):
+        self._flush_now.set()
+        if self._flush_task is not None:
+            await self._flush_task
+            self._flush_task = None
+        await self.flush()
@@ -0,0 +1,123 @@
+import bisect
+import difflib
+
+# Configuration
+NAME_MIN_PREFIX = 3        # Shortest name that may match a longer stored name by prefix ("Alex" -> "Alex Smith")
+NAME_FUZZY_CUTOFF = 0.85   # Similarity (0-1) needed for a fuzzy match of a misspelled name. None = no fuzzy matching
+NAME_KEYS = ("name", "alias", "aliases", "nickname")  # Long-term memory keys that hold names of the user
+
+
+def normalize_name(name: str):
+    return " ".join(str(name).casefold().split())
+
+
+# Names of a user from their long-term memory
+def memory_names(memory: dict):
+    names = set()
+    for key in NAME_KEYS:
+        value = memory.get(key)
+        for item in value if isinstance(value, list) else [value]:
+            if isinstance(item, str) and normalize_name(item):
+                names.add(normalize_name(item))
+    return names
+
+
+# In-memory index from names to user IDs. Exact lookups are a dict hit, prefix and fuzzy lookups
+# search a sorted list with bisect, so resolving a name doesn't scan every user.
+# Names come from the name_to_id mapping (aliases, checked first) and from each user's long-term memory,
+# and the index is updated whenever that memory changes.
+class NameIndex:
+    def __init__(self, min_prefix: int = NAME_MIN_PREFIX, fuzzy_cutoff: float = NAME_FUZZY_CUTOFF):
+        self.min_prefix = min_prefix
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._aliases = {}   # name -> user_id
+        self._stored = {}    # name -> user IDs whose memory has this name
+        self._names_of = {}  # user_id -> names from their memory
+        self._sorted = []    # Every known name, sorted
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def _known(self, name: str):
+        return name in self._aliases or name in self._stored
+
+    def _insert(self, name: str):
+        if not self._known(name):
+            bisect.insort(self._sorted, name)
+
+    def _discard(self, name: str):
+        if not self._known(name):
+            index = bisect.bisect_left(self._sorted, name)
+            if index < len(self._sorted) and self._sorted[index] == name:
+                del self._sorted[index]
+
+    def _owner(self, name: str):
+        if name in self._aliases:
+            return self._aliases[name]
+        users = self._stored.get(name)
+        return next(iter(users)) if users else None
+
+    def build(self, memory_store):
+        for name, user_id in memory_store.iter_name_mappings():
+            self.set_alias(name, user_id)
+        for user_id, memory in memory_store.iter_user_memories():
+            self.set_user(user_id, memory)
+
+    def set_alias(self, name: str, user_id: str):
+        name = normalize_name(name)
+        if name:
+            self._insert(name)
+            self._aliases[name] = user_id
+
+    def get_alias(self, name: str):
+        return self._aliases.get(normalize_name(name))
+
+    # Update the names of one user from their long-term memory (None when the memory was removed)
+    def set_user(self, user_id: str, memory):
+        new_names = memory_names(memory) if memory else set()
+        old_names = self._names_of.get(user_id, set())
+        for name in old_names - new_names:
+            users = self._stored[name]
+            users.discard(user_id)
+            if not users:
+                del self._stored[name]
+            self._discard(name)
+        for name in new_names - old_names:
+            self._insert(name)
+            self._stored.setdefault(name, set()).add(user_id)
+        if new_names:
+            self._names_of[user_id] = new_names
+        else:
+            self._names_of.pop(user_id, None)
+
+    # Memory listener
+    def on_memory_change(self, user_id: str, memory):
+        self.set_user(user_id, memory)
+
+    # User ID for a name: exact (case-insensitive) match, then a unique prefix match, then the closest fuzzy match
+    def lookup(self, name: str):
+        name = normalize_name(name)
+        if not name:
+            return None
+
+        user_id = self._owner(name)
+        if user_id:
+            return user_id
+
+        if len(name) >= self.min_prefix:
+            owners = set()
+            index = bisect.bisect_left(self._sorted, name)
+            while index < len(self._sorted) and self._sorted[index].startswith(name) and len(owners) < 2:
+                owners.add(self._owner(self._sorted[index]))
+                index += 1
+            if len(owners) == 1:
+                return owners.pop()
+
+        if self.fuzzy_cutoff is not None:
+            # Only names with the same first letter are compared
+            low = bisect.bisect_left(self._sorted, name[0])
+            high = bisect.bisect_left(self._sorted, name[0] + "\U0010ffff")
+            matches = difflib.get_close_matches(name, self._sorted[low:high], n=1, cutoff=self.fuzzy_cutoff)
+            if matches:
+                return self._owner(matches[0])
+        return None
@@ -0,0 +1,140 @@
+import logging
+import random
+import time
+from collections import deque
+
+# Configuration
+METRICS_SAMPLES = 1000  # Recent observations kept per timing for percentiles
+
+log = logging.getLogger("discordaibot")
+
+
+def setup_logging(level: str):
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+# True for about rate of all calls. Used to log only a sample of per-message lines on the hot path
+def sampled(rate: float):
+    return rate >= 1 or random.random() < rate
+
+
+def _percentile(ordered: list, p: float):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class _Timing:
+    __slots__ = ("count", "total", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=METRICS_SAMPLES)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+    def percentiles(self, *ps):
+        ordered = sorted(self.samples)
+        return [_percentile(ordered, p) for p in ps]
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.metrics.observe(self.name, time.perf_counter() - self.started)
+        if exc_type is not None:
+            self.metrics.increment(f"{self.name}_errors")
+        return False
+
+
+# Counters and timings of the request pipeline. Timings keep count and sum (for Prometheus)
+# plus a window of recent values for percentiles (for .stats).
+class Metrics:
+    def __init__(self):
+        self.counters = {}
+        self.timings = {}
+        self.started = time.time()
+
+    def increment(self, name: str, value: float = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = _Timing()
+        timing.observe(value)
+
+    # with metrics.span("generation"): ... records how long the block took in seconds
+    def span(self, name: str):
+        return _Span(self, name)
+
+    # Token counts and durations from the final frame of an Ollama generation
+    def record_generation(self, frame: dict, kind: str = "chat"):
+        self.increment(f"ollama_{kind}_generations")
+        self.increment("ollama_prompt_tokens", frame.get("prompt_eval_count", 0))
+        self.increment("ollama_response_tokens", frame.get("eval_count", 0))
+        for field in ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration"):
+            if frame.get(field):
+                self.observe(f"ollama_{field}", frame[field] / 1e9)
+        if frame.get("eval_count") and frame.get("eval_duration"):
+            self.observe("ollama_tokens_per_second", frame["eval_count"] / (frame["eval_duration"] / 1e9))
+
+    # Prometheus text exposition format
+    def render_prometheus(self):
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE discordaibot_{name} counter")
+            lines.append(f"discordaibot_{name} {value}")
+        for name, timing in sorted(self.timings.items()):
+            lines.append(f"# TYPE discordaibot_{name} summary")
+            for p, value in zip((0.5, 0.95, 0.99), timing.percentiles(50, 95, 99)):
+                lines.append(f'discordaibot_{name}{{quantile="{p}"}} {value:.6f}')
+            lines.append(f"discordaibot_{name}_sum {timing.total:.6f}")
+            lines.append(f"discordaibot_{name}_count {timing.count}")
+        return "\n".join(lines) + "\n"
+
+    # Short human readable lines for the .stats command
+    def summary_lines(self, names=None):
+        lines = []
+        for name in names or sorted(self.timings):
+            timing = self.timings.get(name)
+            if timing is None or not timing.count:
+                continue
+            p50, p95 = timing.percentiles(50, 95)
+            if name.endswith(("tokens", "per_second")):
+                lines.append(f"{name}: p50 {p50:.0f}, p95 {p95:.0f} ({timing.count}x)")
+            else:
+                lines.append(f"{name}: p50 {p50 * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms ({timing.count}x)")
+        return lines
+
+    # Serve render_prometheus() on http://0.0.0.0:port/metrics. Returns the aiohttp runner (cleanup() stops it)
+    async def start_http_server(self, port: int, host: str = "0.0.0.0"):
+        from aiohttp import web
+
+        async def handle(request):
+            return web.Response(text=self.render_prometheus(), content_type="text/plain")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        log.info("Metrics endpoint on http://%s:%s/metrics", host, port)
+        return runner
+
+
+# Shared registry used by every module
+metrics = Metrics()
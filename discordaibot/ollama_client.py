@@ -0,0 +1,121 @@
+import asyncio
+import json
+import logging
+
+import aiohttp
+
+from .observability import metrics
+
+# Configuration
+CONNECT_TIMEOUT = 10    # Seconds to wait for a connection to Ollama
+TOTAL_TIMEOUT = None    # Max seconds for a whole generation. None = no limit
+MAX_CONNECTIONS = 8     # Size of the shared keep-alive connection pool
+KEEPALIVE_TIMEOUT = 60  # Seconds an idle pooled connection is kept open
+
+log = logging.getLogger(__name__)
+
+
+# Generation settings for the "options" field of a request. Ollama ignores them as top-level fields.
+# Settings left as None use the model's defaults
+def generation_options(temperature: float = None, num_predict: int = None, num_ctx: int = None):
+    options = {"temperature": temperature, "num_predict": num_predict, "num_ctx": num_ctx}
+    return {key: value for key, value in options.items() if value is not None}
+
+
+# Text of one streamed frame from /api/generate ("response") or /api/chat ("message" -> "content")
+def frame_text(frame: dict):
+    if "message" in frame:
+        return frame["message"].get("content") or ""
+    return frame.get("response") or ""
+
+
+# Asyncio-native Ollama client. One instance owns one aiohttp session, so every
+# request reuses the same pool of keep-alive connections instead of opening a new
+# socket per message, and waiting on Ollama never blocks the Discord event loop.
+# Every generation asks Ollama to keep the model loaded for keep_alive, so the next message doesn't pay for loading it.
+class OllamaClient:
+    # read_timeout: max seconds between two streamed chunks. keep_alive: how long Ollama keeps the model loaded (None = server default)
+    def __init__(self, base_url: str, read_timeout: float, keep_alive: str, connect_timeout: float = CONNECT_TIMEOUT,
+                 total_timeout: float = TOTAL_TIMEOUT, max_connections: int = MAX_CONNECTIONS,
+                 keepalive_timeout: float = KEEPALIVE_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.keep_alive = keep_alive
+        self._session = None
+
+    # The session has to be created inside the running event loop, so it is opened on first use
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={'Content-Type': 'application/json'},
+            )
+        return self._session
+
+    # Stream NDJSON frames from an endpoint as they arrive
+    async def _stream(self, path: str, data: dict):
+        if self.keep_alive is not None and "keep_alive" not in data:
+            data = {**data, "keep_alive": self.keep_alive}
+        session = await self._get_session()
+        async with session.post(f"{self.base_url}{path}", json=data) as response:
+            response.raise_for_status()
+            async for line in response.content:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    line_json = json.loads(line)
+                except json.JSONDecodeError as e:
+                    log.warning("Error parsing line: %s", e)
+                    continue
+
+                if line_json.get('done'):
+                    # Token counts and timings of the generation are only in the final frame
+                    metrics.record_generation(line_json, path.rsplit("/", 1)[-1])
+
+                yield line_json
+
+                if line_json.get('done'):
+                    break
+
+    # Stream frames from /api/generate (single prompt)
+    def stream_generate(self, data: dict):
+        return self._stream("/api/generate", data)
+
+    # Stream frames from /api/chat (list of role/content messages)
+    def stream_chat(self, data: dict):
+        return self._stream("/api/chat", data)
+
+    # Run a whole generation and return the concatenated response text
+    async def generate(self, data: dict):
+        response_data = ""
+        async for line_json in self.stream_generate(data):
+            response_data += frame_text(line_json)
+        return response_data
+
+    # Embedding vector for text from /api/embeddings
+    async def embed(self, model: str, text: str):
+        session = await self._get_session()
+        async with session.post(f"{self.base_url}/api/embeddings", json={"model": model, "prompt": text}) as response:
+            response.raise_for_status()
+            data = await response.json()
+        return data["embedding"]
+
+    # Names of the models currently loaded on the server, from /api/ps. Also works as a health check
+    async def loaded_models(self, timeout: float = CONNECT_TIMEOUT):
+        session = await self._get_session()
+        async with session.get(f"{self.base_url}/api/ps", timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            response.raise_for_status()
+            data = await response.json()
+        return [model.get("name") or model.get("model") for model in data.get("models", [])]
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            # Give the connector a moment to close its sockets cleanly
+            await asyncio.sleep(0.25)
+        self._session = None
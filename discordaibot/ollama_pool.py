@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import logging
+import time
+
+import aiohttp
+
+from .observability import metrics
+from .ollama_client import OllamaClient, frame_text
+
+# Configuration
+HEALTH_CHECK_INTERVAL = 30  # Seconds between checks of which servers are up and which models they have loaded
+FAILURE_COOLDOWN = 30       # Seconds a server that failed to connect is skipped (unless every server is down)
+STICKY_SLACK = 1            # A user's own server is used while it has at most this many more requests running than the least loaded one
+
+log = logging.getLogger(__name__)
+
+# Errors that mean the server itself is unreachable, not that the request was bad
+_CONNECTION_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError, OSError)
+
+
+# "llama3" and "llama3:latest" are the same model
+def normalize_model(name: str):
+    if not name:
+        return name
+    return name if ":" in name else f"{name}:latest"
+
+
+class OllamaBackend:
+    def __init__(self, url: str, client: OllamaClient):
+        self.url = url
+        self.client = client
+        self.in_flight = 0
+        self.served = 0
+        self.failures = 0
+        self.loaded_models = set()
+        self.down_until = 0.0
+
+    def available(self, now: float):
+        return now >= self.down_until
+
+    def mark_down(self, error):
+        self.failures += 1
+        self.down_until = time.monotonic() + FAILURE_COOLDOWN
+        metrics.increment("ollama_server_failures")
+        log.warning("Ollama server %s failed: %s", self.url, error)
+
+    def mark_up(self, models=None):
+        self.down_until = 0.0
+        if models is not None:
+            self.loaded_models = {normalize_model(model) for model in models}
+
+
+# Spreads requests over several Ollama servers. Has the same request methods as OllamaClient plus a user_id,
+# so it can be used in its place.
+# A request goes to the least loaded server that already has the model loaded. Requests of the same user
+# prefer the same server (rendezvous hashing), so the server's prompt cache still holds their conversation.
+# A server that can't be reached is skipped for FAILURE_COOLDOWN seconds and the request goes to the next one.
+# Once a response started streaming it can't be moved, so a failure after that is raised to the caller.
+class OllamaPool:
+    def __init__(self, urls, health_check_interval: float = HEALTH_CHECK_INTERVAL,
+                 sticky_slack: int = STICKY_SLACK, **client_options):
+        if isinstance(urls, str):
+            urls = [urls]
+        self.backends = [OllamaBackend(url, OllamaClient(url, **client_options)) for url in urls]
+        self.health_check_interval = health_check_interval
+        self.sticky_slack = sticky_slack
+        self._health_task = None
+
+    def __len__(self):
+        return len(self.backends)
+
+    @staticmethod
+    def _weight(backend: OllamaBackend, user_id: str):
+        return hashlib.md5(f"{backend.url}|{user_id}".encode()).digest()
+
+    # Server for a request, or None if every server was already tried
+    def _pick(self, model: str, user_id: str = None, exclude=()):
+        now = time.monotonic()
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        candidates = [backend for backend in candidates if backend.available(now)] or candidates
+        if not candidates:
+            return None
+        model = normalize_model(model)
+
+        def load(backend):
+            missing_model = bool(model) and model not in backend.loaded_models
+            return missing_model, backend.in_flight
+
+        best = min(candidates, key=load)
+        if user_id is None:
+            return best
+        home = max(candidates, key=lambda backend: self._weight(backend, user_id))
+        home_missing, home_in_flight = load(home)
+        best_missing, best_in_flight = load(best)
+        if home_missing <= best_missing and home_in_flight <= best_in_flight + self.sticky_slack:
+            return home
+        return best
+
+    def _start(self):
+        if self._health_task is None and len(self.backends) > 1:
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    async def _health_loop(self):
+        while True:
+            await self.check_health()
+            await asyncio.sleep(self.health_check_interval)
+
+    # Ask every server which models it has loaded. Servers that don't answer are marked down
+    async def check_health(self):
+        async def check(backend):
+            try:
+                backend.mark_up(await backend.client.loaded_models())
+            except (aiohttp.ClientError, *_CONNECTION_ERRORS) as e:
+                backend.mark_down(e)
+        await asyncio.gather(*[check(backend) for backend in self.backends])
+
+    async def _stream(self, method: str, data: dict, user_id: str = None):
+        self._start()
+        model = data.get("model")
+        tried = []
+        last_error = None
+        while True:
+            backend = self._pick(model, user_id, tried)
+            if backend is None:
+                raise last_error or aiohttp.ClientConnectionError("No Ollama server available")
+            tried.append(backend)
+            backend.in_flight += 1
+            started = False
+            frames = getattr(backend.client, method)(data)
+            try:
+                async for frame in frames:
+                    started = True
+                    yield frame
+                backend.served += 1
+                if model:
+                    backend.loaded_models.add(normalize_model(model))
+                return
+            except _CONNECTION_ERRORS as e:
+                backend.mark_down(e)
+                if started:
+                    raise
+                last_error = e
+            except aiohttp.ClientResponseError as e:
+                # For example the model is missing on this server, another one may have it
+                if started:
+                    raise
+                last_error = e
+            finally:
+                # Also runs when the caller stops reading early: closing the request makes the server stop generating
+                await frames.aclose()
+                backend.in_flight -= 1
+
+    def stream_generate(self, data: dict, user_id: str = None):
+        return self._stream("stream_generate", data, user_id)
+
+    def stream_chat(self, data: dict, user_id: str = None):
+        return self._stream("stream_chat", data, user_id)
+
+    async def generate(self, data: dict, user_id: str = None):
+        response_data = ""
+        async for line_json in self.stream_generate(data, user_id):
+            response_data += frame_text(line_json)
+        return response_data
+
+    async def embed(self, model: str, text: str):
+        self._start()
+        tried = []
+        last_error = None
+        while True:
+            backend = self._pick(model, exclude=tried)
+            if backend is None:
+                raise last_error or aiohttp.ClientConnectionError("No Ollama server available")
+            tried.append(backend)
+            backend.in_flight += 1
+            try:
+                embedding = await backend.client.embed(model, text)
+                backend.served += 1
+                backend.loaded_models.add(normalize_model(model))
+                return embedding
+            except _CONNECTION_ERRORS as e:
+                backend.mark_down(e)
+                last_error = e
+            except aiohttp.ClientResponseError as e:
+                last_error = e
+            finally:
+                backend.in_flight -= 1
+
+    # One line per server for status messages
+    def status(self):
+        now = time.monotonic()
+        return [f"{backend.url}: {'up' if backend.available(now) else 'down'}, {backend.in_flight} running, "
+                f"{backend.served} served, {backend.failures} failures" for backend in self.backends]
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        await asyncio.gather(*[backend.client.close() for backend in self.backends])
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from .memory_store import atomic_write
+
+log = logging.getLogger(__name__)
+
+
+# Same question asked in a different way ("What is X?" / "what is x") should hit the same entry
+def normalize_prompt(prompt: str):
+    return " ".join(prompt.casefold().split()).rstrip("?!. ")
+
+
+def _hash(text: str):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+# Cache key of a generation: model, system prompt, normalized prompt and a hash of the injected context
+def make_cache_key(model: str, system_prompt: str, prompt: str, context: str = ""):
+    return _hash(json.dumps([model, _hash(system_prompt), normalize_prompt(prompt), _hash(context or "")]))
+
+
+class _Entry:
+    __slots__ = ("response", "expires_at", "size", "user_ids")
+
+    def __init__(self, response, expires_at, user_ids):
+        self.response = response
+        self.expires_at = expires_at
+        self.size = len(response.encode())
+        self.user_ids = list(user_ids)
+
+
+# LRU cache of generated responses with a size cap in bytes and a TTL per entry.
+# Entries remember which users' memory went into them, so they can be dropped when that memory changes.
+class ResponseCache:
+    def __init__(self, max_bytes: int, ttl: float, cache_file: str = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.cache_file = cache_file
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries = OrderedDict()  # Least recently used first
+        self._user_keys = {}           # user_id -> keys of entries built with their memory
+        self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.time():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.response
+
+    def put(self, key: str, response: str, user_ids=(), ttl: float = None):
+        if key in self._entries:
+            self._remove(key)
+        entry = _Entry(response, time.time() + (self.ttl if ttl is None else ttl), user_ids)
+        if entry.size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.size += entry.size
+        for user_id in entry.user_ids:
+            self._user_keys.setdefault(user_id, set()).add(key)
+        # Evict least recently used entries until the cache fits
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    # Drop every entry that was built with this user's memory or history
+    def invalidate_user(self, user_id: str):
+        for key in list(self._user_keys.pop(user_id, ())):
+            self._remove(key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry.size
+        for user_id in entry.user_ids:
+            keys = self._user_keys.get(user_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._user_keys[user_id]
+
+    def _load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r") as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            log.warning("Failed to load response cache: %s", e)
+            return
+        now = time.time()
+        for key, response, expires_at, user_ids in data:
+            if expires_at > now:
+                self.put(key, response, user_ids, ttl=expires_at - now)
+
+    def save(self):
+        if not self.cache_file:
+            return
+        now = time.time()
+        data = [[key, entry.response, entry.expires_at, entry.user_ids]
+                for key, entry in self._entries.items() if entry.expires_at > now]
+        atomic_write(self.cache_file, json.dumps(data))
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+
+from .context_builder import CHARS_PER_TOKEN, estimate_tokens
+from .observability import metrics
+
+# Configuration
+HISTORY_MAX_MESSAGES = 100  # Hard cap of stored turns per user, only reached if summarizing keeps failing
+
+log = logging.getLogger(__name__)
+
+
+def format_turn(turn: dict):
+    return f"{turn['role']}: {turn['content']}"
+
+
+def turn_tokens(turn: dict):
+    return estimate_tokens(format_turn(turn)) + 1
+
+
+# Split history into (older, recent) where recent is the newest turns that fit into token_budget.
+# A user message and the answers after it are kept or folded together, and the newest exchange is always kept.
+def split_history(history: list, token_budget: int):
+    exchanges = []
+    for turn in history:
+        if not exchanges or turn["role"] == "User":
+            exchanges.append([])
+        exchanges[-1].append(turn)
+
+    kept = 0
+    used = 0
+    for exchange in reversed(exchanges):
+        tokens = sum(turn_tokens(turn) for turn in exchange)
+        if kept and used + tokens > token_budget:
+            break
+        used += tokens
+        kept += 1
+
+    cut = sum(len(exchange) for exchange in exchanges[:len(exchanges) - kept])
+    return history[:cut], history[cut:]
+
+
+# Cut a summary to max_tokens, at the end of a sentence when possible
+def clip_summary(summary: str, max_tokens: int):
+    summary = " ".join(summary.split())
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(summary) <= limit:
+        return summary
+    clipped = summary[:limit]
+    end = max(clipped.rfind(". "), clipped.rfind("! "), clipped.rfind("? "))
+    return clipped[:end + 1] if end > limit // 2 else clipped.rstrip() + "..."
+
+
+# Chat history of each user as a token-budgeted window of recent turns plus a running summary of older ones.
+# When a user's history grows past token_budget, the oldest turns are folded into their summary in the background
+# with summarize(previous_summary, turns), a coroutine function, and removed from the store.
+# Until that finishes the prompt just uses the newest turns, so replies never wait for a summary.
+class RollingHistory:
+    def __init__(self, memory_store, summarize, token_budget: int, summary_tokens: int, max_messages: int = HISTORY_MAX_MESSAGES):
+        self.memory_store = memory_store
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.max_messages = max_messages
+        self._tasks = {}  # user_id -> running fold
+
+    # True while older turns are being summarized
+    @property
+    def pending(self):
+        return bool(self._tasks)
+
+    # (summary, recent turns) for the prompt
+    def window(self, user_id: str):
+        _, recent = split_history(self.memory_store.get_history(user_id), self.token_budget)
+        return self.memory_store.get_history_summary(user_id), recent
+
+    def append(self, user_id: str, turns: list):
+        self.memory_store.append_history(user_id, turns, self.max_messages)
+        older, _ = split_history(self.memory_store.get_history(user_id), self.token_budget)
+        if older and user_id not in self._tasks:
+            task = asyncio.get_running_loop().create_task(self._fold(user_id, older))
+            self._tasks[user_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(user_id, None))
+
+    async def _fold(self, user_id: str, older: list):
+        previous_summary = self.memory_store.get_history_summary(user_id)
+        try:
+            summary = await self.summarize(previous_summary, [format_turn(turn) for turn in older])
+        except Exception as e:
+            log.warning("Failed to summarize chat history of %s: %s", user_id, e)
+            return
+        if not summary:
+            return
+        # Only applied if the history still starts with the summarized turns (it may have been cleared meanwhile)
+        if self.memory_store.fold_history(user_id, older, clip_summary(summary, self.summary_tokens)):
+            metrics.increment("history_turns_folded", len(older))
+
+    async def close(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
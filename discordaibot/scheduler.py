@@ -0,0 +1,110 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+from .observability import metrics
+
+# Configuration
+WAIT_SAMPLES = 100  # Number of recent queue wait times used for the average
+
+
+class _Job:
+    __slots__ = ("user_id", "factory", "future", "enqueued_at")
+
+    def __init__(self, user_id, factory, future):
+        self.user_id = user_id
+        self.factory = factory
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+# Accepts every request immediately and runs them in fair order.
+# Each user has a FIFO queue. Free generation slots are handed out round-robin
+# between users, so one user sending many prompts cannot starve everyone else.
+class GenerationScheduler:
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max(1, max_concurrent)
+        self.running = 0
+        self._queues = OrderedDict()  # user_id -> deque of jobs. Key order is the round-robin order
+        self._tasks = set()
+        self._wait_times = deque(maxlen=WAIT_SAMPLES)
+
+    # Queue factory() (a coroutine function) for the user.
+    # Returns (future, position). Position 0 means the job started right away.
+    def submit(self, user_id: str, factory):
+        job = _Job(user_id, factory, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(user_id, deque()).append(job)
+        self._pump()
+        return job.future, self.position(job)
+
+    # Queue factory() and wait for its result
+    async def run(self, user_id: str, factory):
+        future, _ = self.submit(user_id, factory)
+        return await future
+
+    # 1-based place of a job in the order it will be started, 0 if it is not waiting
+    def position(self, job: _Job):
+        queue = self._queues.get(job.user_id)
+        if not queue or job not in queue:
+            return 0
+        index = queue.index(job)
+        position = index + 1
+        before = True
+        for user_id, other in self._queues.items():
+            if user_id == job.user_id:
+                before = False
+                continue
+            # Users ahead in the rotation also get served in this job's round, users behind only in earlier rounds
+            position += min(len(other), index + 1 if before else index)
+        return position
+
+    def queue_depth(self, user_id: str = None):
+        if user_id is not None:
+            return len(self._queues.get(user_id, ()))
+        return sum(len(queue) for queue in self._queues.values())
+
+    def oldest_wait(self):
+        now = time.monotonic()
+        waits = [now - queue[0].enqueued_at for queue in self._queues.values() if queue]
+        return max(waits, default=0.0)
+
+    def average_wait(self):
+        if not self._wait_times:
+            return 0.0
+        return sum(self._wait_times) / len(self._wait_times)
+
+    # Start jobs while there are free slots, taking one job per user in turn
+    def _pump(self):
+        while self.running < self.max_concurrent and self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+
+            if job.future.done():  # Caller gave up while the job was waiting
+                continue
+
+            self.running += 1
+            wait = time.monotonic() - job.enqueued_at
+            self._wait_times.append(wait)
+            metrics.observe("queue_wait", wait)
+            task = asyncio.create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: _Job):
+        try:
+            result = await job.factory()
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            if not job.future.done():  # The job itself was cancelled
+                job.future.cancel()
+            self.running -= 1
+            self._pump()
@@ -0,0 +1,245 @@
+import json
+import sqlite3
+from itertools import groupby
+
+from .observability import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    guild_id TEXT NOT NULL DEFAULT '',
+    user_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_history_user ON chat_history (guild_id, user_id, id);
+
+CREATE TABLE IF NOT EXISTS history_summaries (
+    guild_id TEXT NOT NULL DEFAULT '',
+    user_id TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_facts (
+    guild_id TEXT NOT NULL DEFAULT '',
+    user_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (guild_id, user_id, key)
+);
+
+CREATE TABLE IF NOT EXISTS name_to_id (
+    guild_id TEXT NOT NULL DEFAULT '',
+    name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (guild_id, name)
+);
+"""
+
+BOT_USER_ID = "bot"  # Bot's long-term memory is stored as facts of this user
+
+
+def _encode(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+# Same interface as MemoryStore, backed by SQLite.
+# Rows are keyed by user ID (and guild ID), so a message turn only touches the rows of the users
+# it changes instead of rewriting whole JSON files. Writes are committed right away.
+class SqliteMemoryStore:
+    def __init__(self, db_file: str, guild_id: str = ""):
+        self.db_file = db_file
+        self.guild_id = guild_id
+        self.writes = 0
+        self.bytes_written = 0
+        self._conn = sqlite3.connect(db_file)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # Safe with WAL, avoids an fsync per commit
+        self._conn.executescript(SCHEMA)
+        self._memory_listeners = []
+
+    # callback(user_id, memory) is called whenever a user's long-term memory changes. memory is None when it was removed
+    def add_memory_listener(self, callback):
+        self._memory_listeners.append(callback)
+
+    def _memory_changed(self, user_id: str, memory):
+        for callback in self._memory_listeners:
+            callback(user_id, memory)
+
+    def _written(self, size: int):
+        self.writes += 1
+        self.bytes_written += size
+        metrics.increment("memory_writes")
+        metrics.increment("memory_bytes_written", size)
+
+    # ---- Chat history ----
+
+    def has_history(self, user_id: str):
+        row = self._conn.execute(
+            "SELECT 1 FROM chat_history WHERE guild_id = ? AND user_id = ? LIMIT 1",
+            (self.guild_id, user_id),
+        ).fetchone()
+        return row is not None
+
+    def get_history(self, user_id: str):
+        rows = self._conn.execute(
+            "SELECT role, content FROM chat_history WHERE guild_id = ? AND user_id = ? ORDER BY id",
+            (self.guild_id, user_id),
+        )
+        return [{"role": role, "content": content} for role, content in rows]
+
+    # Add turns to the user's history and keep only the last max_messages
+    def append_history(self, user_id: str, turns: list, max_messages: int):
+        with metrics.span("persistence"), self._conn:
+            self._conn.executemany(
+                "INSERT INTO chat_history (guild_id, user_id, role, content) VALUES (?, ?, ?, ?)",
+                [(self.guild_id, user_id, turn["role"], turn["content"]) for turn in turns],
+            )
+            self._conn.execute(
+                """DELETE FROM chat_history WHERE guild_id = ? AND user_id = ? AND id < (
+                       SELECT id FROM chat_history WHERE guild_id = ? AND user_id = ?
+                       ORDER BY id DESC LIMIT 1 OFFSET ?)""",
+                (self.guild_id, user_id, self.guild_id, user_id, max_messages - 1),
+            )
+        self._written(sum(len(turn["content"]) for turn in turns))
+
+    def get_history_summary(self, user_id: str):
+        row = self._conn.execute(
+            "SELECT summary FROM history_summaries WHERE guild_id = ? AND user_id = ?",
+            (self.guild_id, user_id),
+        ).fetchone()
+        return row[0] if row else ""
+
+    # Replace the oldest turns with a new summary. Returns False if the history no longer starts with turns
+    def fold_history(self, user_id: str, turns: list, summary: str):
+        if not turns:
+            return False
+        rows = self._conn.execute(
+            "SELECT id, role, content FROM chat_history WHERE guild_id = ? AND user_id = ? ORDER BY id LIMIT ?",
+            (self.guild_id, user_id, len(turns)),
+        ).fetchall()
+        if [{"role": role, "content": content} for _, role, content in rows] != turns:
+            return False
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM chat_history WHERE guild_id = ? AND user_id = ? AND id <= ?",
+                (self.guild_id, user_id, rows[-1][0]),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO history_summaries (guild_id, user_id, summary) VALUES (?, ?, ?)",
+                (self.guild_id, user_id, summary),
+            )
+        self._written(len(summary))
+        return True
+
+    # ---- Long-term memory ----
+
+    def _get_facts(self, user_id: str):
+        rows = self._conn.execute(
+            "SELECT key, value FROM user_facts WHERE guild_id = ? AND user_id = ? ORDER BY rowid",
+            (self.guild_id, user_id),
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def get_bot_memory(self):
+        return self._get_facts(BOT_USER_ID)
+
+    def get_user_memory(self, user_id: str):
+        if user_id in (BOT_USER_ID, "name_to_id"):
+            return None
+        return self._get_facts(user_id) or None
+
+    # (user_id, memory) for every user with long-term memory
+    def iter_user_memories(self):
+        rows = self._conn.execute(
+            "SELECT user_id, key, value FROM user_facts WHERE guild_id = ? AND user_id != ? ORDER BY user_id, rowid",
+            (self.guild_id, BOT_USER_ID),
+        ).fetchall()
+        for user_id, facts in groupby(rows, key=lambda row: row[0]):
+            yield user_id, {key: json.loads(value) for _, key, value in facts}
+
+    def set_user_memory(self, user_id: str, memory: dict):
+        if user_id in (BOT_USER_ID, "name_to_id"):  # Never overwrite the special sections
+            return
+        self._set_facts(user_id, memory)
+        self._memory_changed(user_id, memory)
+
+    def _set_facts(self, user_id: str, memory: dict):
+        rows = [(self.guild_id, user_id, key, _encode(value)) for key, value in memory.items()]
+        with metrics.span("persistence"), self._conn:
+            self._conn.execute(
+                "DELETE FROM user_facts WHERE guild_id = ? AND user_id = ?",
+                (self.guild_id, user_id),
+            )
+            self._conn.executemany(
+                "INSERT INTO user_facts (guild_id, user_id, key, value) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        self._written(sum(len(row[3]) for row in rows))
+
+    def iter_name_mappings(self):
+        return iter(self._conn.execute(
+            "SELECT name, user_id FROM name_to_id WHERE guild_id = ?",
+            (self.guild_id,),
+        ).fetchall())
+
+    def set_name_mapping(self, name: str, user_id: str):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO name_to_id (guild_id, name, user_id) VALUES (?, ?, ?)",
+                (self.guild_id, name, user_id),
+            )
+        self._written(len(name))
+
+    # Remove the user's chat history and long-term memory
+    def clear_user(self, user_id: str):
+        if user_id == BOT_USER_ID:
+            return
+        with self._conn:
+            self._conn.execute("DELETE FROM chat_history WHERE guild_id = ? AND user_id = ?", (self.guild_id, user_id))
+            self._conn.execute("DELETE FROM history_summaries WHERE guild_id = ? AND user_id = ?", (self.guild_id, user_id))
+            deleted = self._conn.execute("DELETE FROM user_facts WHERE guild_id = ? AND user_id = ?", (self.guild_id, user_id)).rowcount
+        self._written(0)
+        if deleted:
+            self._memory_changed(user_id, None)
+
+    # ---- Migration ----
+
+    # Import data in the JSON file layout used by MemoryStore.
+    # Users that already have chat history in the database keep it, so running the import twice doesn't duplicate turns.
+    def import_json(self, chat_history: dict, long_term_memory: dict):
+        imported_history = 0
+        for user_id, turns in chat_history.items():
+            if user_id == "summaries":
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO history_summaries (guild_id, user_id, summary) VALUES (?, ?, ?)",
+                        [(self.guild_id, summary_user_id, summary) for summary_user_id, summary in turns.items()],
+                    )
+            elif turns and not self.has_history(user_id):
+                self.append_history(user_id, turns, len(turns))
+                imported_history += 1
+
+        imported_memory = 0
+        for user_id, memory in long_term_memory.items():
+            if user_id == "name_to_id":
+                for name, mapped_user_id in memory.items():
+                    self.set_name_mapping(name, mapped_user_id)
+            elif memory:
+                self._set_facts(user_id, memory)
+                imported_memory += 1
+        return imported_history, imported_memory
+
+    # ---- Persistence ----
+
+    # Every change is already committed, these exist so both stores can be used the same way
+    @property
+    def dirty(self):
+        return False
+
+    async def flush(self):
+        return True
+
+    async def close(self):
+        self._conn.close()
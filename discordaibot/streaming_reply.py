@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+
+import discord
+
+from .discord_dispatcher import MESSAGE_LIMIT, ChannelDispatcher, split_point
+
+log = logging.getLogger(__name__)
+
+
+# Incremental version of process_think_section for streamed text.
+# Tags can be split between chunks, so a possible start of a tag at the end of a chunk is held back until the next one.
+# With show_think the <think> section is shown in a spoiler, otherwise it is removed.
+class ThinkFilter:
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self, show_think: bool):
+        self.show_think = show_think
+        self.inside = False
+        self._buffer = ""
+        self._held = ""  # Text of an open <think> section (kept in case it is never closed)
+
+    # Tags that end the current piece of text. In spoiler mode every tag just becomes ||
+    def _tags(self):
+        if self.show_think:
+            return (self.OPEN_TAG, self.CLOSE_TAG)
+        return (self.CLOSE_TAG,) if self.inside else (self.OPEN_TAG,)
+
+    def feed(self, chunk: str):
+        self._buffer += chunk
+        output = ""
+        while True:
+            found = [(self._buffer.find(tag), tag) for tag in self._tags()]
+            found = [(index, tag) for index, tag in found if index != -1]
+            if not found:
+                break
+            index, tag = min(found)
+            output += self._emit(self._buffer[:index])
+            self._buffer = self._buffer[index + len(tag):]
+            if self.show_think:
+                output += "||"
+            else:
+                self._held = ""  # Section is closed (or just opened), nothing held back
+                self.inside = not self.inside
+
+        # Keep back the longest end of the buffer that could still become a tag
+        keep = 0
+        for length in range(min(len(self.CLOSE_TAG) - 1, len(self._buffer)), 0, -1):
+            if any(tag.startswith(self._buffer[-length:]) for tag in self._tags()):
+                keep = length
+                break
+        ready = self._buffer[:len(self._buffer) - keep]
+        self._buffer = self._buffer[len(self._buffer) - keep:]
+        return output + self._emit(ready)
+
+    def _emit(self, text: str):
+        if self.inside and not self.show_think:
+            self._held += text
+            return ""
+        return text
+
+    # Text left at the end of the stream. Like process_think_section, a <think> that was never closed is kept as it is
+    def finish(self):
+        output = self._emit(self._buffer)
+        self._buffer = ""
+        if self.inside and not self.show_think:
+            output = self.OPEN_TAG + self._held + output
+        self.inside = False
+        self._held = ""
+        return output
+
+
+# Shows a reply while it is being generated by editing the "Thinking..." message.
+# Edits are coalesced: at most one edit or send every edit_interval seconds, always with the newest text,
+# and they go through the channel's dispatcher so they respect its rate limit.
+# When the text passes the message limit, it continues in a new message.
+# Text can be appended before the first message is attached, it is shown once attach() is called.
+class StreamingReply:
+    def __init__(self, dispatcher: ChannelDispatcher, edit_interval: float, limit: int = MESSAGE_LIMIT):
+        self.dispatcher = dispatcher
+        self.edit_interval = edit_interval
+        self.limit = limit
+        self.messages = []
+        self._parts = [""]     # Text of every message of the reply
+        self._shown = [None]   # Text currently shown in every message
+        self._last_update = 0.0
+        self._finished = False
+        self._changed = asyncio.Event()
+        self._task = None
+
+    # Start updating first_message (the "Thinking..." message) with the reply
+    def attach(self, first_message: discord.Message):
+        self.messages.append(first_message)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    def append(self, text: str):
+        if not text:
+            return
+        if not self.text:
+            text = text.lstrip()  # Like strip() of the whole reply
+            if not text:
+                return
+        self._parts[-1] += text
+        # Roll over to a new message at a natural boundary
+        while len(self._parts[-1]) > self.limit:
+            part = self._parts[-1]
+            cut = split_point(part, self.limit)
+            self._parts[-1] = part[:cut]
+            self._parts.append(part[cut:].lstrip())
+            self._shown.append(None)
+        self._changed.set()
+
+    async def _run(self):
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            # Wait for the next free slot, more text collected in the meantime goes into the same edit
+            delay = self._last_update + self.edit_interval - time.monotonic()
+            if delay > 0 and not self._finished:
+                await asyncio.sleep(delay)
+            await self._sync()
+            if self._finished and not self._changed.is_set():
+                return
+
+    # Bring every message up to date: edit changed ones, send new ones
+    async def _sync(self):
+        for i, part in enumerate(self._parts):
+            content = part.rstrip() if i == len(self._parts) - 1 else part
+            if not content.strip() or content == self._shown[i]:
+                continue
+            try:
+                if i < len(self.messages):
+                    await self.dispatcher.edit(self.messages[i], content)
+                else:
+                    self.messages.append(await self.dispatcher.send(content))
+                self._shown[i] = content
+            except discord.HTTPException as e:
+                log.warning("Failed to update streamed message: %s", e)
+                if i >= len(self.messages):
+                    return  # Try again with the next update, keep the messages in order
+            self._last_update = time.monotonic()
+
+    # Wait until the whole reply is shown. fallback is shown if the stream produced no visible text (for example an error).
+    # error is the error the stream ended with, if any. Below text that was already shown it is added as a notice,
+    # so a reply that was cut off doesn't look complete
+    async def finish(self, fallback: str = "", error: str = None):
+        if not self.text.strip():
+            if fallback:
+                self.append(fallback)
+        elif error:
+            self.append(f"\n\n⚠️ Response interrupted. {error}")
+        self._finished = True
+        self._changed.set()
+        if self._task is not None:
+            await self._task
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from .observability import metrics
+from .ollama_pool import normalize_model
+
+log = logging.getLogger(__name__)
+
+
+# Keeps the model loaded and the system prompts in Ollama's prompt cache, so the first message after startup,
+# or after Ollama unloaded the model, doesn't wait for the model to load and for the whole system prompt to be read.
+# requests are (name, method, data) for OllamaClient, for example ("chat", "stream_chat", {...}). Each one should look
+# like the real requests (same model, system prompt and options) and generate a single token. They run in order
+# on every server, so put the one users wait for last: with one slot a server only caches its last prompt.
+# options must be the options of the real requests: a different num_ctx makes Ollama load the model again.
+class ModelWarmer:
+    def __init__(self, pool, model: str, requests: list, options: dict, ping_interval: float):
+        self.pool = pool
+        self.model = model
+        self.requests = requests
+        self.options = options
+        self.ping_interval = ping_interval
+        self.cold_starts = 0
+        self.latencies = {}  # name -> (cold seconds, warm seconds) of the last warm-up
+        self._task = None
+
+    # Run one request on a server. Returns how many seconds it took
+    async def _run(self, backend, method: str, data: dict):
+        started = time.perf_counter()
+        async for _ in getattr(backend.client, method)(data):
+            pass
+        return time.perf_counter() - started
+
+    # True if the server has the model loaded, from /api/ps
+    async def _is_loaded(self, backend):
+        return normalize_model(self.model) in {normalize_model(model) for model in await backend.client.loaded_models()}
+
+    # A request without a prompt only loads the model (and restarts its keep_alive timer).
+    # Its answer has no timings, so whether the model was loaded is checked with _is_loaded
+    def _load(self, backend):
+        return self._run(backend, "stream_generate", {"model": self.model, "options": self.options})
+
+    async def _warm_backend(self, backend, was_loaded: bool = None):
+        if was_loaded is None:
+            was_loaded = await self._is_loaded(backend)
+        seconds = await self._load(backend)
+        metrics.observe("warmup_load", seconds)
+        log.info("Model %s on %s loaded in %.1fs (%s)", self.model, backend.url, seconds,
+                 "was already loaded" if was_loaded else "was not loaded")
+        # The first run of a request reads its whole system prompt, the second one finds it in the prompt cache
+        for name, method, data in self.requests:
+            cold = await self._run(backend, method, data)
+            warm = await self._run(backend, method, data)
+            metrics.observe("warmup_cold", cold)
+            metrics.observe("warmup_warm", warm)
+            self.latencies[name] = (cold, warm)
+            log.info("Primed %s prompt on %s: cold %.2fs, warm %.2fs", name, backend.url, cold, warm)
+
+    # Load the model and prime the prompts on every server
+    async def warm(self):
+        async def warm_backend(backend):
+            try:
+                await self._warm_backend(backend)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                log.warning("Warm-up of %s failed: %s", backend.url, e)
+        await asyncio.gather(*[warm_backend(backend) for backend in self.pool.backends])
+
+    # Keep the model loaded on every server. A server that had unloaded it anyway is warmed up again
+    async def ping(self):
+        async def ping_backend(backend):
+            try:
+                if await self._is_loaded(backend):
+                    await self._load(backend)
+                else:
+                    self.cold_starts += 1
+                    metrics.increment("model_cold_starts")
+                    log.warning("Model %s was unloaded on %s, warming it up again", self.model, backend.url)
+                    await self._warm_backend(backend, was_loaded=False)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                log.warning("Keep-alive ping to %s failed: %s", backend.url, e)
+        await asyncio.gather(*[ping_backend(backend) for backend in self.pool.backends])
+
+    # Warm up in the background, then ping every ping_interval seconds
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def _run_forever(self):
+        await self.warm()
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            await self.ping()
+
+    # One line per primed prompt for status messages
+    def status(self):
+        return [f"Warm-up {name}: cold {cold:.2f}s, warm {warm:.2f}s" for name, (cold, warm) in self.latencies.items()]
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,34 @@
+# One-shot import of chat_history.json and long_term_memory.json into the SQLite memory database.
+# Usage: python migrate_to_sqlite.py [chat_history.json] [long_term_memory.json] [memory.db] [server id]
+# Without a server id the memory is imported for direct messages (and for all servers when GUILD_MEMORY is off).
+import asyncio
+import json
+import os
+import sys
+
+from discordaibot import config
+from discordaibot.sqlite_store import SqliteMemoryStore
+
+
+def load_json(path: str):
+    if not os.path.exists(path):
+        print(f"{path} not found, skipping.")
+        return {}
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def main():
+    chat_history_file = sys.argv[1] if len(sys.argv) > 1 else "chat_history.json"
+    long_term_memory_file = sys.argv[2] if len(sys.argv) > 2 else "long_term_memory.json"
+    db_file = sys.argv[3] if len(sys.argv) > 3 else config.SQLITE_DB_FILE
+    guild_id = sys.argv[4] if len(sys.argv) > 4 else ""
+
+    store = SqliteMemoryStore(db_file, guild_id)
+    imported_history, imported_memory = store.import_json(load_json(chat_history_file), load_json(long_term_memory_file))
+    asyncio.run(store.close())
+    print(f"Imported chat history of {imported_history} users and long-term memory of {imported_memory} entries into {db_file}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+from discordaibot.context_builder import ContextBuilder, estimate_tokens
+
+
+def test_shared_line_stays_in_every_section():
+    context = ContextBuilder(token_budget=1000)
+    context.add_section("alice", "Long-Term Memory for Alice:", ["name: Alice", "preference: likes chess"], priority=3)
+    context.add_section("bob", "Long-Term Memory for Bob:", ["name: Bob", "preference: likes chess"], priority=1)
+    context.build()
+    assert context.kept_lines("alice") == ["name: Alice", "preference: likes chess"]
+    assert context.kept_lines("bob") == ["name: Bob", "preference: likes chess"]
+    assert context.duplicate_tokens == 0
+    assert context.saved_tokens == 0
+
+
+def test_repeated_line_within_a_section_is_dropped():
+    context = ContextBuilder(token_budget=1000)
+    context.add_section("alice", "Alice:", ["name: Alice", "pet: cat", "pet: cat"])
+    context.build()
+    assert context.kept_lines("alice") == ["name: Alice", "pet: cat"]
+    assert context.duplicate_tokens == estimate_tokens("pet: cat") + 1
+
+
+def test_dedupe_off_keeps_repeated_lines():
+    context = ContextBuilder(token_budget=1000)
+    context.add_section("history", "", ["User: hi", "User: hi"], dedupe=False)
+    context.build()
+    assert context.kept_lines("history") == ["User: hi", "User: hi"]
+
+
+def test_same_key_is_added_once():
+    context = ContextBuilder(token_budget=1000)
+    context.add_section("alice", "Alice:", ["name: Alice"])
+    context.add_section("alice", "Alice:", ["name: Alice"])
+    assert context.build() == "Alice:\nname: Alice"
+    assert context.duplicate_tokens == estimate_tokens("name: Alice") + 1
+
+
+def test_lower_priority_is_trimmed_first_and_history_keeps_newest():
+    turns = [f"User: message {i}".ljust(40) for i in range(3)]  # 11 tokens each with the newline
+    context = ContextBuilder(token_budget=25)
+    context.add_section("bot", "", ["fact: something"], priority=0)
+    context.add_section("history", "", turns, priority=2, keep_newest=True, dedupe=False)
+    context.build()
+    assert context.kept_lines("history") == turns[1:]
+    assert context.kept_lines("bot") == []
+    assert context.trimmed_tokens == 11 + estimate_tokens("fact: something") + 1
@@ -0,0 +1,74 @@
+import asyncio
+
+from benchmarks.fake_discord import FakeChannel, FakeGuild, FakeUser
+from discordaibot.discord_dispatcher import ChannelDispatcher, InteractionChannel, split_message
+
+
+def test_short_text_is_one_message():
+    assert split_message("  Hello there!  ") == ["Hello there!"]
+    assert split_message("") == []
+
+
+def test_every_message_fits_and_no_text_is_lost():
+    text = " ".join(f"Sentence number {i} is here." for i in range(400))
+    chunks = split_message(text, limit=200)
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert " ".join(chunks) == text
+
+
+def test_prefers_paragraph_then_sentence_boundaries():
+    first = "a" * 60 + "."
+    assert split_message(first + "\n\n" + "b" * 60, limit=100) == [first, "b" * 60]
+    assert split_message(first + " " + "Next one here." + " " + "c" * 50, limit=100) == [
+        first + " Next one here.", "c" * 50,
+    ]
+
+
+def test_long_word_is_cut_at_the_limit():
+    chunks = split_message("x" * 250, limit=100)
+    assert "".join(chunks) == "x" * 250
+    assert all(len(chunk) <= 100 for chunk in chunks)
+
+
+def test_split_code_block_is_closed_and_reopened():
+    code = "```python\n" + "\n".join(f"print({i})" for i in range(40)) + "\n```"
+    chunks = split_message("Here is the code:\n" + code, limit=120)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk) <= 120
+        assert chunk.count("```") % 2 == 0  # Every message has its code block closed
+    assert all(chunk.startswith("```python") for chunk in chunks[1:])
+    lines = [line for chunk in chunks for line in chunk.splitlines() if line.startswith("print(")]
+    assert lines == [f"print({i})" for i in range(40)]
+
+
+def test_reply_moves_to_channel_when_interaction_expires():
+    async def run():
+        channel = FakeChannel(FakeGuild(), api_latency=0)
+        interaction = channel.interaction(FakeUser("alice"))
+        outbound = ChannelDispatcher(InteractionChannel(interaction))
+        thinking = await outbound.send("Thinking...")
+        interaction.expired = True
+        await outbound.edit(thinking, "Hello")
+        await outbound.edit(thinking, "Hello there")
+        await outbound.send("More")
+        return thinking, channel.events
+
+    thinking, events = asyncio.run(run())
+    assert thinking.content == "Thinking..."  # The follow-up can't be edited any more
+    assert [(kind, content) for _, kind, _, content in events] == [
+        ("send", "Thinking..."), ("send", "Hello"), ("edit", "Hello there"), ("send", "More"),
+    ]
+
+
+def test_follow_ups_are_edited_while_interaction_is_valid():
+    async def run():
+        channel = FakeChannel(FakeGuild(), api_latency=0)
+        outbound = ChannelDispatcher(InteractionChannel(channel.interaction(FakeUser("alice"))))
+        thinking = await outbound.send("Thinking...")
+        await outbound.edit(thinking, "Hello")
+        return thinking, channel.events
+
+    thinking, events = asyncio.run(run())
+    assert thinking.content == "Hello"
+    assert [kind for _, kind, _, _ in events] == ["send", "edit"]
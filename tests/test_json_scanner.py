@@ -0,0 +1,51 @@
+from discordaibot.json_scanner import JsonObjectScanner
+
+
+def scan(*pieces):
+    scanner = JsonObjectScanner()
+    for piece in pieces:
+        scanner.feed(piece)
+    return scanner
+
+
+def test_objects_between_text_and_code_fences():
+    scanner = scan('Sure! ```json\n{"name": "Alice"}\n```\nand {"pet": "cat"} trailing garbage ]} {')
+    assert scanner.objects == [{"name": "Alice"}, {"pet": "cat"}]
+    assert scanner.skipped == 0
+
+
+def test_nested_objects_and_brackets_in_strings():
+    scanner = scan('{"a": {"b": [1, {"c": "}]{["}]}, "d": "\\"}"}')
+    assert scanner.objects == [{"a": {"b": [1, {"c": "}]{["}]}, "d": '"}'}]
+
+
+def test_comments_are_skipped():
+    scanner = scan('{"a": 1, // note }\n "b": /* } */ 2, "url": "http://x"}')
+    assert scanner.objects == [{"a": 1, "b": 2, "url": "http://x"}]
+
+
+def test_pieces_split_anywhere():
+    text = '{"name": "Bob", /* c */ "likes": ["chess", "tea"]} {"x": "a\\"b"}'
+    assert scan(*text).objects == scan(text).objects == [{"name": "Bob", "likes": ["chess", "tea"]}, {"x": 'a"b'}]
+
+
+def test_feed_returns_completed_objects():
+    scanner = JsonObjectScanner()
+    assert scanner.feed('{"a": ') == []
+    assert scanner.feed('1} {"b"') == [{"a": 1}]
+    assert scanner.feed(': 2}') == [{"b": 2}]
+
+
+def test_invalid_object_is_skipped():
+    scanner = scan('{"a": 1,} {"b": 2}')
+    assert scanner.objects == [{"b": 2}]
+    assert scanner.skipped == 1
+
+
+def test_mismatched_brackets_resync_at_next_object():
+    scanner = scan('{"a": [1} then {"b": 2} and {"c": 3}')
+    assert scanner.objects == [{"b": 2}, {"c": 3}]
+    assert scanner.skipped == 1
+    scanner = scan('{"a": {"x": 1]} {"b": 2}')
+    assert scanner.objects == [{"b": 2}]
+    assert scanner.skipped == 1
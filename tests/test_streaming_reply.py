@@ -0,0 +1,73 @@
+import asyncio
+
+from discordaibot import config
+from discordaibot.engine import process_think_section
+from discordaibot.streaming_reply import StreamingReply, ThinkFilter
+
+
+def stream(show_think: bool, chunks):
+    think_filter = ThinkFilter(show_think)
+    return "".join(think_filter.feed(chunk) for chunk in chunks) + think_filter.finish()
+
+
+def test_think_section_removed_across_chunks():
+    text = "<think>plan the answer</think>Hello there"
+    for size in range(1, len(text) + 1):
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        assert stream(False, chunks) == "Hello there"
+
+
+def test_think_section_shown_as_spoiler():
+    assert stream(True, ["<thi", "nk>plan</th", "ink>Hi"]) == "||plan||Hi"
+
+
+def test_unclosed_think_section_is_kept():
+    assert stream(False, ["Hi <think>unfinished"]) == "Hi <think>unfinished"
+
+
+def test_text_that_only_looks_like_a_tag():
+    assert stream(False, ["a <", "b> <thin", "g>"]) == "a <b> <thing>"
+
+
+def test_matches_process_think_section(monkeypatch):
+    monkeypatch.setattr(config, "SHOW_THINK_SECTION", False)
+    text = "<think>reasoning</think>The answer is 42."
+    assert stream(False, [text[:10], text[10:]]) == process_think_section(text)
+
+
+class FakeMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeDispatcher:
+    async def send(self, content: str):
+        return FakeMessage(content)
+
+    async def edit(self, message, content: str):
+        message.content = content
+
+
+def run_reply(streamed: str, fallback: str, error: str = None):
+    async def run():
+        reply = StreamingReply(FakeDispatcher(), edit_interval=0)
+        message = FakeMessage("Thinking...")
+        reply.attach(message)
+        reply.append(streamed)
+        await reply.finish(fallback=fallback, error=error)
+        return message.content
+    return asyncio.run(run())
+
+
+def test_fallback_shown_when_nothing_was_streamed():
+    assert run_reply("", "Error: Request timed out.", "Error: Request timed out.") == "Error: Request timed out."
+
+
+def test_interrupted_stream_shows_notice():
+    content = run_reply("The answer is", "Error: Request timed out.", "Error: Request timed out.")
+    assert content.startswith("The answer is")
+    assert content.endswith("⚠️ Response interrupted. Error: Request timed out.")
+
+
+def test_complete_stream_has_no_notice():
+    assert run_reply("The answer is 42.", "The answer is 42.") == "The answer is 42."